@@ -0,0 +1,6 @@
+"""
+Init file for the helpers shared by the scripts in this repository.
+"""
+# flake8: noqa
+
+from . import concurrency, http_cache, rate_limit
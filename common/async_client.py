@@ -0,0 +1,268 @@
+"""
+asyncio client for the GitHub REST and GraphQL APIs, paced by a RateLimitScheduler.
+
+Requests are sent with aiohttp, with no more than a configured number in flight
+at once, so scripts can fan out over many organizations and repositories from a
+single thread instead of waiting on one blocking request at a time.
+"""
+
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs, urlparse
+
+import aiohttp
+import requests
+from octopy_admin.graph.graph_client import GraphClientError
+from octopy_admin.rest.rest_client import RestClientError
+from requests.structures import CaseInsensitiveDict
+
+from .http_cache import cached_links
+from .rate_limit import SECONDARY_RATE_LIMIT_WAIT, default_scheduler
+
+DEFAULT_MAX_IN_FLIGHT = 10
+DEFAULT_TIMEOUT = 10
+
+
+def get_api_urls(hostname=None):
+    """
+    Get the REST and GraphQL API URLs of github.com, or of a GHES hostname.
+    """
+    if hostname is None:
+        hostname = os.environ.get("GHE_HOSTNAME")
+    if not hostname:
+        return "https://api.github.com", "https://api.github.com/graphql"
+    return f"https://{hostname}/api/v3", f"https://{hostname}/api/graphql"
+
+
+class AsyncResponse:
+    """
+    Response of a request sent by the AsyncGitHubClient, read in full, with the
+    attributes of a requests.Response that the rate limit scheduler reads.
+    """
+
+    def __init__(self, url: str, status_code: int, headers, text: str, links: dict):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.links = links
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    def json(self):
+        """
+        Parse the response body.
+        """
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        """
+        Raise a RestClientError if the request failed.
+        """
+        if not self:
+            raise RestClientError(f"HTTP error: {self.status_code} for url: {self.url}")
+
+
+def cached_response(url: str, entry: dict) -> AsyncResponse:
+    """
+    Build an AsyncResponse from a response of a ResponseCache.
+    """
+    return AsyncResponse(
+        url,
+        200,
+        CaseInsensitiveDict(entry["headers"]),
+        entry["body"].decode("utf-8"),
+        cached_links(entry["headers"]),
+    )
+
+
+class AsyncGitHubClient:
+    """
+    asyncio client for the GitHub REST and GraphQL APIs. Use it as an async
+    context manager to open and close its connection pool.
+    """
+
+    def __init__(
+        self,
+        api_url=None,
+        graph_url=None,
+        api_token=None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        scheduler=None,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache=None,
+    ):
+        """
+        Initialize the client.
+        Attributes:
+            api_url (str): REST API URL, github.com or GHE_HOSTNAME if None.
+            graph_url (str): GraphQL API URL, github.com or GHE_HOSTNAME if None.
+            api_token (str): GitHub API token, API_TOKEN if None.
+            max_in_flight (int): Number of requests allowed in flight at once.
+            scheduler (obj): RateLimitScheduler to use, the shared default if None.
+            timeout (float): Seconds to wait on a request.
+            cache (obj): ResponseCache for GET requests, None to not cache.
+        """
+        if api_token is None:
+            api_token = os.environ.get("API_TOKEN")
+            if api_token is None:
+                raise RestClientError("API_TOKEN environment variable is not set")
+        default_api_url, default_graph_url = get_api_urls()
+        self._api_url = (api_url or default_api_url).rstrip("/")
+        self._graph_url = graph_url or default_graph_url
+        self._headers = {
+            "Authorization": f"Bearer {api_token}",
+            "Accept": "application/vnd.github+json",
+        }
+        self._slots = asyncio.Semaphore(max(1, max_in_flight))
+        self._scheduler = scheduler or default_scheduler
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._cache = cache
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            headers=self._headers, timeout=self._timeout
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, url: str, **kwargs):
+        """
+        Send a request once the scheduler allows it, retrying when rate limited.
+        With a ResponseCache, a GET request is served from the cache while its
+        response is fresh, and otherwise sent with the ETag of the cached response.
+        Attributes:
+            method (str): HTTP method.
+            url (str): URL, or a path under the REST API URL.
+            kwargs: Arguments passed on to aiohttp, such as params or json.
+        """
+        if url.startswith("/"):
+            url = self._api_url + url
+        if self._cache is None or method.lower() != "get":
+            return await self._send(method, url, **kwargs)
+
+        full_url = requests.Request("GET", url, params=kwargs.get("params"))
+        full_url = full_url.prepare().url
+        key = self._cache.key(full_url, self._headers)
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry["fresh"]:
+                return cached_response(full_url, entry)
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                "If-None-Match": entry["etag"],
+            }
+        response = await self._send(method, url, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self._cache.revalidated(key)
+            return cached_response(full_url, entry)
+        if response.status_code == 200:
+            self._cache.store(key, response.headers, response.text.encode("utf-8"))
+        return response
+
+    async def _send(self, method: str, url: str, **kwargs):
+        """
+        Send a request once the scheduler allows it, retrying when rate limited.
+        """
+        for attempt in range(self._scheduler.max_retries + 1):
+            async with self._slots:
+                await asyncio.sleep(max(self._scheduler.reserve_turn(), 0))
+                try:
+                    async with self._session.request(method, url, **kwargs) as resp:
+                        response = AsyncResponse(
+                            str(resp.url),
+                            resp.status,
+                            resp.headers,
+                            await resp.text(),
+                            {
+                                rel: {"url": str(link["url"])}
+                                for rel, link in resp.links.items()
+                            },
+                        )
+                except asyncio.TimeoutError as errtimeout:
+                    raise RestClientError(f"Timeout error: {url}") from errtimeout
+                except aiohttp.ClientError as errexcept:
+                    raise RestClientError(
+                        f"Unexpected error: {errexcept}"
+                    ) from errexcept
+            wait = self._scheduler.update(response, attempt)
+            if wait is None or attempt == self._scheduler.max_retries:
+                return response
+            print(f"Rate limited on {url}, retrying in {int(wait)} seconds.")
+        return response
+
+    async def paginate(self, url: str, params=None):
+        """
+        Follow the Link headers of a REST listing and return the items of every page.
+        Attributes:
+            url (str): URL, or a path under the REST API URL.
+            params (dict): Query parameters of the first page.
+        """
+        items = []
+        params = {"per_page": 100, **(params or {})}
+        while url:
+            response = await self.request("get", url, params=params)
+            response.raise_for_status()
+            items.extend(response.json())
+            # The next page link already carries the query parameters:
+            url = response.links.get("next", {}).get("url")
+            params = None
+        return items
+
+    async def count(self, url: str, params=None):
+        """
+        Count the items of a REST listing with one request of a single item per
+        page, where the page number of the last page link is the total.
+        Attributes:
+            url (str): URL, or a path under the REST API URL.
+            params (dict): Query parameters of the listing.
+        """
+        response = await self.request(
+            "get", url, params={**(params or {}), "per_page": 1}
+        )
+        response.raise_for_status()
+        last_page = response.links.get("last", {}).get("url")
+        if last_page is None:
+            # A listing that fits on one page has no last page link:
+            return len(response.json())
+        return int(parse_qs(urlparse(last_page).query)["page"][0])
+
+    async def graphql(self, query: str, variables=None):
+        """
+        Run a GraphQL query and return its data, retrying when its error message
+        reports a rate limit.
+        Attributes:
+            query (str): GraphQL query.
+            variables (dict): Query variables.
+        """
+        for attempt in range(self._scheduler.max_retries + 1):
+            try:
+                response = await self.request(
+                    "post",
+                    self._graph_url,
+                    json={"query": query, "variables": variables},
+                )
+            except RestClientError as error:
+                raise GraphClientError(str(error)) from error
+            if not response:
+                raise GraphClientError(
+                    f"Server responded with a {response.status_code} status code"
+                )
+            result = response.json()
+            if not result.get("errors"):
+                return result["data"]
+            message = result["errors"][0].get("message", "")
+            if (
+                "rate limit" not in message.lower()
+                or attempt == self._scheduler.max_retries
+            ):
+                raise GraphClientError(message)
+            print(f"Rate limited, retrying in {SECONDARY_RATE_LIMIT_WAIT} seconds.")
+            self._scheduler.pause(SECONDARY_RATE_LIMIT_WAIT, slow_down=True)
+        raise GraphClientError("Rate limited")
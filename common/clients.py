@@ -0,0 +1,89 @@
+"""
+octopy-admin clients that send their requests through a RateLimitScheduler.
+"""
+# pylint: disable=too-few-public-methods
+
+from functools import partial
+
+import requests
+from octopy_admin.graph.graph_client import GraphClient
+from octopy_admin.rest.rest_client import RestClient, RestClientError
+
+from .http_cache import send_cached
+from .rate_limit import default_scheduler
+
+
+class ScheduledRestClient(RestClient):
+    """
+    RestClient whose requests are paced by a RateLimitScheduler.
+    """
+
+    def __init__(self, scheduler=None, cache=None, **kwargs):
+        """
+        Initialize the REST client.
+        Attributes:
+            scheduler (obj): RateLimitScheduler to use, the shared default if None.
+            cache (obj): ResponseCache for GET requests, None to not cache.
+            kwargs: Arguments passed on to RestClient.
+        """
+        self._scheduler = scheduler or default_scheduler
+        self._cache = cache
+        super().__init__(**kwargs)
+
+    def _execute(self, method, url, payload=None, params=None):
+        """
+        Execute a request through the scheduler, and GET requests through the
+        response cache if there is one.
+
+        Attributes:
+            method (str): HTTP method.
+            url (str): URL.
+            payload (dict): Payload.
+        """
+        try:
+            response = send_cached(
+                self._cache if method.upper() == "GET" else None,
+                partial(self._scheduler.request, method),
+                url,
+                self._headers,
+                params=params,
+                json=payload,
+                timeout=10,
+                verify=self._verify,
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.Timeout as errtimeout:
+            raise RestClientError(f"Timeout error: {errtimeout}") from errtimeout
+        except requests.exceptions.HTTPError as errhttp:
+            raise RestClientError(f"HTTP error: {errhttp}") from errhttp
+        except requests.exceptions.TooManyRedirects as errredirect:
+            raise RestClientError(f"Too many redirects: {errredirect}") from errredirect
+        except requests.exceptions.RequestException as errexcept:
+            raise RestClientError(f"Unexpected error: {errexcept}") from errexcept
+
+
+class ScheduledGraphClient(GraphClient):
+    """
+    GraphClient whose queries are paced by a RateLimitScheduler.
+    """
+
+    def __init__(self, scheduler=None, **kwargs):
+        """
+        Initialize the GraphQL client.
+        Attributes:
+            scheduler (obj): RateLimitScheduler to use, the shared default if None.
+            kwargs: Arguments passed on to GraphClient.
+        """
+        self._scheduler = scheduler or default_scheduler
+        super().__init__(**kwargs)
+
+    def _execute(self, query, params=None):
+        """
+        Execute a query through the scheduler.
+
+        Attributes:
+            query (str): GraphQL query.
+            params (dict): Query parameters.
+        """
+        return self._scheduler.call(super()._execute, query, params)
@@ -0,0 +1,19 @@
+"""
+Helpers to run work in parallel without queueing the whole input.
+"""
+
+from collections import deque
+
+
+def bounded_map(executor, func, items, window):
+    """
+    Map func over items with the executor, keeping at most window calls in
+    flight. Results are yielded in the order of items as they complete.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
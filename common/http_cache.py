@@ -0,0 +1,208 @@
+"""
+Persistent cache of GitHub REST API responses, validated with ETags.
+
+Successful GET responses are stored in a SQLite file with their ETag. Within
+its time to live a response is served without a request; after that, the
+request is sent with If-None-Match and a 304 Not Modified answer, which does
+not count against the primary rate limit, is served from the cache. The least
+recently used responses are evicted once the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import parse_header_links
+
+DEFAULT_TTL = 0
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Response headers kept with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Link")
+
+
+class ResponseCache:
+    """
+    SQLite cache of response bodies keyed by request, shared between threads.
+    """
+
+    def __init__(
+        self, path: str, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE
+    ):
+        """
+        Open or create the cache.
+        Attributes:
+            path (str): Path of the SQLite file.
+            ttl (float): Seconds a response is served without revalidating it.
+            max_size (int): Bytes of response bodies kept before evicting.
+        """
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, etag TEXT, headers TEXT, body BLOB, "
+            "size INTEGER, stored_at REAL, accessed_at REAL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(url: str, headers=None) -> str:
+        """
+        Get the cache key of a GET request: its full URL and a hash of its
+        Authorization header, so tokens with different access never share.
+        Attributes:
+            url (str): Full URL of the request, including its query string.
+            headers (dict): Headers of the request.
+        """
+        authorization = (headers or {}).get("Authorization", "")
+        token_hash = hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:16]
+        return f"{token_hash} {url}"
+
+    def get(self, key: str):
+        """
+        Get a cached response as a dict of its etag, headers and body, with
+        fresh set if it is still within its time to live, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, headers, body, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._db.commit()
+        etag, headers, body, stored_at = row
+        return {
+            "etag": etag,
+            "headers": json.loads(headers),
+            "body": body,
+            "fresh": time.time() - stored_at < self._ttl,
+        }
+
+    def revalidated(self, key: str):
+        """
+        Restart the time to live of a response the server reported as not modified.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+
+    def store(self, key: str, headers, body: bytes):
+        """
+        Store a response that has an ETag, evicting the least recently used
+        responses while the cache is over its size limit.
+        Attributes:
+            key (str): Cache key of the request.
+            headers (dict): Response headers.
+            body (bytes): Response body.
+        """
+        etag = headers.get("ETag")
+        if not etag or len(body) > self._max_size:
+            return
+        kept_headers = {
+            name: headers[name] for name in CACHED_HEADERS if name in headers
+        }
+        now = time.time()
+        with self._lock:
+            old = self._db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, etag, json.dumps(kept_headers), body, len(body), now, now),
+            )
+            self._size += len(body) - (old[0] if old else 0)
+            if self._size > self._max_size:
+                evicted = []
+                for evicted_key, size in self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at"
+                ):
+                    if self._size <= self._max_size:
+                        break
+                    evicted.append((evicted_key,))
+                    self._size -= size
+                self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            self._db.commit()
+
+    def close(self):
+        """
+        Close the SQLite file.
+        """
+        with self._lock:
+            self._db.close()
+
+
+def cached_links(headers: dict) -> dict:
+    """
+    Parse the Link header of a cached response the way requests does.
+    """
+    links = {}
+    for link in parse_header_links(headers.get("Link", "")):
+        links[link.get("rel") or link.get("url")] = link
+    return links
+
+
+def cached_response(url: str, entry: dict) -> requests.Response:
+    """
+    Build a requests.Response from a cached response.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = "utf-8"
+    # pylint: disable-next=protected-access
+    response._content = entry["body"]
+    return response
+
+
+def send_cached(cache, send, url: str, headers: dict, **kwargs):
+    """
+    Send a GET request through a ResponseCache with requests: serve a fresh
+    response from the cache, or revalidate a stale one with its ETag.
+    Attributes:
+        cache (obj): ResponseCache, or None to send the request as is.
+        send (callable): Function sending the request, called with the URL,
+            headers and kwargs, such as RateLimitScheduler.request.
+        url (str): URL.
+        headers (dict): Headers of the request.
+        kwargs: Arguments passed on to send, such as params.
+    """
+    if cache is None:
+        return send(url, headers=headers, **kwargs)
+    params = kwargs.get("params")
+    full_url = requests.Request("GET", url, params=params).prepare().url
+    key = cache.key(full_url, headers)
+    entry = cache.get(key)
+    if entry is not None:
+        if entry["fresh"]:
+            return cached_response(full_url, entry)
+        headers = {**headers, "If-None-Match": entry["etag"]}
+    response = send(url, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        cache.revalidated(key)
+        return cached_response(full_url, entry)
+    if response.status_code == 200:
+        cache.store(key, response.headers, response.content)
+    return response
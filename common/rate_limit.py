@@ -0,0 +1,191 @@
+"""
+Rate limit aware scheduling of GitHub API requests.
+
+The scheduler reads the X-RateLimit-* and Retry-After headers of every response
+and paces the following requests, so long running scripts stay under GitHub's
+primary and secondary rate limits instead of bursting and getting blocked.
+"""
+
+import threading
+import time
+
+import requests
+
+# GitHub allows no more than 100 concurrent requests across the REST and GraphQL APIs
+MAX_CONCURRENT_REQUESTS = 100
+
+# Seconds to wait after a secondary rate limit response without a Retry-After header
+SECONDARY_RATE_LIMIT_WAIT = 60
+
+# Share of the primary rate limit below which the remaining requests are spread out until reset
+LOW_RATE_LIMIT_SHARE = 0.1
+
+RATE_LIMIT_STATUS_CODES = (403, 429)
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class RateLimitScheduler:
+    """
+    Paces GitHub API requests to stay under the primary and secondary rate limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 10,
+        min_interval: float = 0.0,
+        max_interval: float = 10.0,
+        max_retries: int = 5,
+    ):
+        """
+        Initialize the scheduler.
+        Attributes:
+            max_concurrent (int): Number of requests allowed in flight at once.
+            min_interval (float): Minimum seconds between the start of two requests.
+            max_interval (float): Maximum seconds the adaptive interval backs off to.
+            max_retries (int): Number of times a rate limited request is retried.
+        """
+        self._slots = threading.BoundedSemaphore(
+            max(1, min(max_concurrent, MAX_CONCURRENT_REQUESTS))
+        )
+        self._lock = threading.Lock()
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._next_request = 0.0
+        self._paused_until = 0.0
+        self._limit = None
+        self._remaining = None
+        self._reset = None
+        self.max_retries = max_retries
+
+    def _wait_for_turn(self):
+        """
+        Reserve the next request start time and sleep until it comes.
+        """
+        wait = self.reserve_turn()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve_turn(self) -> float:
+        """
+        Reserve the next request start time without sleeping, for callers that
+        wait on their own, such as asyncio code.
+        Returns the seconds to wait before sending the request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = self._interval
+            if self._remaining is not None and self._remaining < (
+                self._limit * LOW_RATE_LIMIT_SHARE
+            ):
+                # Spread what is left of the primary rate limit until it resets
+                window = self._reset - time.time()
+                if window > 0:
+                    interval = max(interval, window / max(self._remaining, 1))
+            start = max(now, self._next_request, self._paused_until)
+            self._next_request = start + interval
+            if self._remaining is not None:
+                self._remaining -= 1
+        return start - now
+
+    def pause(self, seconds: float, slow_down: bool = False):
+        """
+        Hold all requests for a number of seconds and optionally back off the interval.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            if slow_down:
+                self._interval = min(max(self._interval * 2, 0.5), self._max_interval)
+
+    def _relax(self):
+        """
+        Ease the interval back towards the minimum after a successful request.
+        """
+        with self._lock:
+            self._interval = max(self._min_interval, self._interval - 0.05)
+
+    def update(self, response, attempt: int = 0):
+        """
+        Record the rate limit headers of a response.
+        Returns the seconds to wait before retrying, or None if no retry is needed.
+        Attributes:
+            response (obj): Response of a GitHub API request.
+            attempt (int): Number of times the request was already retried.
+        """
+        headers = response.headers
+        if "X-RateLimit-Remaining" in headers:
+            with self._lock:
+                self._limit = int(headers.get("X-RateLimit-Limit", 5000))
+                self._remaining = int(headers["X-RateLimit-Remaining"])
+                self._reset = int(headers.get("X-RateLimit-Reset", time.time()))
+
+        if response.status_code in RATE_LIMIT_STATUS_CODES:
+            if "Retry-After" in headers:
+                wait = int(headers["Retry-After"])
+                self.pause(wait, slow_down=True)
+                return wait
+            if headers.get("X-RateLimit-Remaining") == "0":
+                wait = max(self._reset - time.time(), 1)
+                self.pause(wait)
+                return wait
+            if "secondary rate limit" in response.text.lower():
+                self.pause(SECONDARY_RATE_LIMIT_WAIT, slow_down=True)
+                return SECONDARY_RATE_LIMIT_WAIT
+            return None
+        if response.status_code in RETRY_STATUS_CODES:
+            wait = 2**attempt
+            self.pause(wait, slow_down=True)
+            return wait
+        self._relax()
+        return None
+
+    def request(self, method: str, url: str, session=None, **kwargs):
+        """
+        Send a request once the scheduler allows it, retrying when rate limited.
+        Attributes:
+            method (str): HTTP method.
+            url (str): URL.
+            session (obj): Optional requests.Session to send the request with.
+            kwargs: Arguments passed on to requests.
+        """
+        send = session.request if session is not None else requests.request
+        for attempt in range(self.max_retries + 1):
+            with self._slots:
+                self._wait_for_turn()
+                response = send(method, url, **kwargs)
+            wait = self.update(response, attempt)
+            if wait is None or attempt == self.max_retries:
+                return response
+            print(f"Rate limited on {url}, retrying in {int(wait)} seconds.")
+        return response
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run a call that does not expose response headers, such as a GraphQL query,
+        retrying when its error message reports a rate limit.
+        Attributes:
+            func (callable): Function sending the request.
+            args, kwargs: Arguments passed on to func.
+        """
+        for attempt in range(self.max_retries + 1):
+            with self._slots:
+                self._wait_for_turn()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:  # pylint: disable=broad-except
+                    if (
+                        "rate limit" not in str(error).lower()
+                        or attempt == self.max_retries
+                    ):
+                        raise
+                    print(
+                        f"Rate limited, retrying in {SECONDARY_RATE_LIMIT_WAIT} seconds."
+                    )
+                    self.pause(SECONDARY_RATE_LIMIT_WAIT, slow_down=True)
+                    continue
+            self._relax()
+            return result
+
+
+# Scheduler shared by code that does not create its own
+default_scheduler = RateLimitScheduler()
@@ -1,6 +1,7 @@
 """
 Init file for the apis package.
 """
+
 # flake8: noqa
 
-from . import actions, dependabot
+from . import actions, codespaces, dependabot, secrets, session
@@ -0,0 +1,15 @@
+"""
+Endpoints to manage Codespaces Secrets using the REST API.
+"""
+
+# pylint: disable=too-few-public-methods
+
+from .secrets import SecretsEndpoints
+
+
+class CodespacesSecrets(SecretsEndpoints):
+    """
+    Endpoints to manage Codespaces Secrets using the REST API.
+    """
+
+    secret_type = "codespaces"
@@ -0,0 +1,205 @@
+"""
+Endpoints to manage secrets using the REST API, shared by every secret type.
+"""
+
+# pylint: disable=too-many-arguments, too-many-public-methods, too-many-lines, duplicate-code
+
+from common.rate_limit import default_scheduler
+
+
+class SecretsEndpoints:
+    """
+    Endpoints to manage secrets using the REST API. Subclasses set the path of
+    their secret type, such as "actions", and everything else is shared.
+    """
+
+    # Path segment of the secret type in the endpoint URLs:
+    secret_type = None
+    # Type of the repository IDs sent when creating a secret with selected visibility:
+    repository_id_type = int
+
+    def __init__(self, api_url: str, session, scheduler=None):
+        """
+        Initializes the class with the API URL, the shared session used for
+        every request and the rate limit scheduler, the shared default if None.
+        """
+        self._api_url = api_url
+        self._session = session
+        self._scheduler = scheduler or default_scheduler
+
+    def _list_secrets(self, url: str):
+        """
+        Follow the pages of a secrets listing and return all of the secrets
+        """
+        secrets = []
+        params = {"per_page": 100}
+        while url:
+            result = self._scheduler.request(
+                "get", url, session=self._session, params=params
+            )
+            result.raise_for_status()
+            secrets.extend(result.json()["secrets"])
+            # The next page link already carries the query parameters:
+            url = result.links.get("next", {}).get("url")
+            params = None
+        return secrets
+
+    def list_org_secrets(self, org: str):
+        """
+        List secrets for an organization, without their values
+        """
+        return self._list_secrets(
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets"
+        )
+
+    def list_repo_secrets(self, org: str, repo: str):
+        """
+        List secrets for a repository, without their values
+        """
+        return self._list_secrets(
+            f"{self._api_url}/repos/{org}/{repo}/{self.secret_type}/secrets"
+        )
+
+    def get_org_public_key(self, org: str):
+        """
+        Get unique 32 bytes public key of the secret type
+        """
+        org_public_key_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/public-key"
+        )
+
+        result = self._scheduler.request(
+            "get", org_public_key_url, session=self._session
+        )
+        return result.json()
+
+    def get_repo_public_key(self, org: str, repo: str):
+        """
+        Get unique 32 bytes public key of the secret type
+        """
+        repo_public_key_url = (
+            f"{self._api_url}/repos/{org}/{repo}/{self.secret_type}/secrets/public-key"
+        )
+
+        result = self._scheduler.request(
+            "get", repo_public_key_url, session=self._session
+        )
+        return result.json()
+
+    def update_org_secret(
+        self,
+        org: str,
+        secret_name: str,
+        encrypted_value: str,
+        key_id: str,
+        visibility: str,
+    ):
+        """
+        Update or create secrets for an organization
+        """
+        data = {
+            "encrypted_value": encrypted_value,
+            "key_id": key_id,
+            "visibility": visibility,
+        }
+        org_update_secret_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/{secret_name}"
+        )
+
+        result = self._scheduler.request(
+            "put", org_update_secret_url, session=self._session, json=data
+        )
+        return result
+
+    def update_org_secret_scoped(
+        self,
+        org: str,
+        secret_name: str,
+        encrypted_value: str,
+        key_id: str,
+        visibility: str,
+        repo: str,
+    ):
+        """
+        Update or create secrets for an organization, scoped to a repo
+        """
+        repo_ids = list(map(self.repository_id_type, repo.split(";")))
+        data = {
+            "encrypted_value": encrypted_value,
+            "key_id": key_id,
+            "visibility": visibility,
+            "selected_repository_ids": repo_ids,
+        }
+        org_update_secret_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/{secret_name}"
+        )
+
+        result = self._scheduler.request(
+            "put", org_update_secret_url, session=self._session, json=data
+        )
+        return result
+
+    def set_org_secret_repos(self, org: str, secret_name: str, repo_ids: list):
+        """
+        Replace the repositories an organization secret with selected
+        visibility is scoped to
+        """
+        data = {"selected_repository_ids": list(map(int, repo_ids))}
+        org_secret_repos_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/{secret_name}"
+            "/repositories"
+        )
+
+        result = self._scheduler.request(
+            "put", org_secret_repos_url, session=self._session, json=data
+        )
+        return result
+
+    def add_org_secret_repo(self, org: str, secret_name: str, repo_id: int):
+        """
+        Add a repository to an organization secret with selected visibility
+        """
+        org_secret_repo_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/{secret_name}"
+            f"/repositories/{repo_id}"
+        )
+
+        result = self._scheduler.request(
+            "put", org_secret_repo_url, session=self._session
+        )
+        return result
+
+    def remove_org_secret_repo(self, org: str, secret_name: str, repo_id: int):
+        """
+        Remove a repository from an organization secret with selected visibility
+        """
+        org_secret_repo_url = (
+            f"{self._api_url}/orgs/{org}/{self.secret_type}/secrets/{secret_name}"
+            f"/repositories/{repo_id}"
+        )
+
+        result = self._scheduler.request(
+            "delete", org_secret_repo_url, session=self._session
+        )
+        return result
+
+    def update_repo_secret(
+        self,
+        org: str,
+        repo: str,
+        secret_name: str,
+        encrypted_value: str,
+        key_id: str,
+    ):
+        """
+        Update or create secrets for a repository
+        """
+        data = {"encrypted_value": encrypted_value, "key_id": key_id}
+        repo_update_secret_url = (
+            f"{self._api_url}/repos/{org}/{repo}/{self.secret_type}"
+            f"/secrets/{secret_name}"
+        )
+        result = self._scheduler.request(
+            "put", repo_update_secret_url, session=self._session, json=data
+        )
+        return result
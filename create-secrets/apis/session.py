@@ -0,0 +1,38 @@
+"""
+Pooled HTTP session shared by the secrets endpoints.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10
+
+
+class SecretsSession(requests.Session):
+    """
+    Session that keeps connections to the API alive in a pool and applies a
+    default timeout to every request.
+    """
+
+    def __init__(self, headers: dict, pool_size: int = DEFAULT_POOL_SIZE, timeout=None):
+        """
+        Initializes the session.
+        Attributes:
+            headers (dict): Headers sent with every request, such as Authorization.
+            pool_size (int): Number of connections kept alive per host.
+            timeout (float): Seconds to wait for the server, DEFAULT_TIMEOUT if None.
+        """
+        super().__init__()
+        self.headers.update(headers)
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Send a request, using the session timeout unless one is given.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
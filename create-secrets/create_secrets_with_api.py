@@ -3,20 +3,73 @@ Script to create secrets for an organization and it's repositories.
 """
 
 import csv
+import hashlib
+import hmac
 import json
 import os
+import sys
+import threading
+from abc import ABC, abstractmethod
 from base64 import b64encode
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
 
-import apis
+import requests
 from dotenv import load_dotenv
 from nacl import encoding, public
 
+# Make the helpers shared by the scripts in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+import apis  # noqa: E402
+from common.concurrency import bounded_map  # noqa: E402
+from common.rate_limit import RateLimitScheduler  # noqa: E402
+
 load_dotenv()
 
 # Load environment variables:
 NAME_PROPERTIES_FILE = os.getenv("SHARED_PROPERTIES_FILE")
 ORGANIZATION_NAME = os.getenv("ORGANIZATION")
 GITHUB_TOKEN = os.getenv("API_TOKEN")
+POOL_SIZE = int(os.getenv("POOL_SIZE", str(apis.session.DEFAULT_POOL_SIZE)))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", str(apis.session.DEFAULT_TIMEOUT)))
+WORKERS = int(os.getenv("WORKERS", "1"))
+RESULTS_FILE = os.getenv("RESULTS_FILE")
+SYNC_STATE_FILE = os.getenv("SYNC_STATE_FILE")
+SYNC_STATE_KEY = os.getenv("SYNC_STATE_KEY")
+
+PROPERTIES_HEADER = [
+    "SecretLevel",
+    "SecretType",
+    "SecretName",
+    "SecretValue",
+    "SecretAccess",
+    "RepositoryName",
+    "RepositoryID",
+]
+
+RESULTS_HEADER = [
+    "SecretLevel",
+    "SecretType",
+    "SecretName",
+    "RepositoryName",
+    "StatusCode",
+    "Status",
+    "Message",
+]
+
+# Endpoints of each SecretType:
+SECRET_ENDPOINTS = {
+    "Action": apis.actions.ActionsSecrets,
+    "Dependabot": apis.dependabot.DependabotSecrets,
+    "Codespaces": apis.codespaces.CodespacesSecrets,
+}
+
+# Status codes returned when a secret is sent with a key_id that is no longer valid
+STALE_KEY_STATUS_CODES = (400, 422)
 
 
 def get_api_url():
@@ -42,184 +95,524 @@ def get_headers():
     return headers
 
 
-def create_properties_map(file_name: str):
+def read_properties(file_name: str):
     """
-    Create key-value pairs with values loaded from CSV file
+    Yield the rows loaded from CSV file one at a time, so uploads start right
+    away and memory stays flat however large the file is
     """
     with open(file_name, newline="") as csvfile:
-        properties_map = list(csv.DictReader(csvfile, delimiter=","))
-    result_properties = json.dumps(properties_map)
-    return result_properties
+        reader = csv.DictReader(csvfile, delimiter=",")
+        missing_columns = [
+            column
+            for column in PROPERTIES_HEADER
+            if column not in (reader.fieldnames or [])
+        ]
+        if missing_columns:
+            raise ValueError(
+                f"{file_name} is missing the columns: {', '.join(missing_columns)}"
+            )
+        yield from reader
 
 
-def encrypt(public_key: str, secret_value: str) -> str:
+def seal(public_key: str) -> public.SealedBox:
     """
-    Encrypt a Unicode string using the public key.
+    Build the sealed box for a base64 encoded public key, to reuse for every
+    value encrypted with that key.
     """
     public_key = public.PublicKey(public_key.encode("utf-8"), encoding.Base64Encoder())
-    sealed_box = public.SealedBox(public_key)
+    return public.SealedBox(public_key)
+
+
+def encrypt(sealed_box: public.SealedBox, secret_value: str) -> str:
+    """
+    Encrypt a Unicode string using the sealed box of a public key.
+    """
     encrypted = sealed_box.encrypt(secret_value.encode("utf-8"))
     return b64encode(encrypted).decode("utf-8")
 
 
-def main():
+class KeyedCache(ABC):
     """
-    Orchestrate calls necessary to populate organization and repo secrets based on a given file
+    Values keyed by (repository, secret type), where the repository is None for
+    the organization. Values are only fetched the first time a row needs them.
     """
 
-    base_api_url = get_api_url()
-    api_headers = get_headers()
-
-    # Retrieve unique action public key and key id pair for an organization:
-    result_org_action_publickey = apis.actions.ActionsSecrets.get_org_public_key(
-        base_api_url, api_headers, ORGANIZATION_NAME
-    )
-    action_org_public_key_id = result_org_action_publickey["key_id"]
-    action_org_public_key_32bytes = result_org_action_publickey["key"]
+    def __init__(self, endpoints: dict):
+        """
+        Initializes the cache with the secret endpoints for each secret type.
+        """
+        self._endpoints = endpoints
+        self._values = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
 
-    # Retrieve unique dependabot public key and key id pair for an organization:
-    result_org_depd_publickey = apis.dependabot.DependabotSecrets.get_org_public_key(
-        base_api_url, api_headers, ORGANIZATION_NAME
-    )
-    dependabot_org_public_key_id = result_org_depd_publickey["key_id"]
-    dependabot_org_public_key_32bytes = result_org_depd_publickey["key"]
-
-    # Load properties that will be added/updated in a wanted organization:
-    map_properties = json.loads(create_properties_map(NAME_PROPERTIES_FILE))
-
-    # Loop through properties loaded from CSV file to create/update GitHub Actions in an org:
-    for row in map_properties:
-        # Remove any white space:
-        secret_level = row["SecretLevel"].replace(" ", "")
-        secret_type = row["SecretType"].replace(" ", "")
-        secret_name = row["SecretName"].replace(" ", "")
-        secret_value = row["SecretValue"].replace(" ", "")
-        secret_visibility = row["SecretAccess"].replace(" ", "")
-        secret_repo = row["RepositoryName"]
-        secret_repo_id = row["RepositoryID"]
-
-        # Get encrypted value based on 32 bytes long public key from GitHub:
-        action_org_encrypted_value = encrypt(
-            action_org_public_key_32bytes, secret_value
-        )
-        dependabot_org_encrypted_value = encrypt(
-            dependabot_org_public_key_32bytes, secret_value
-        )
+    @abstractmethod
+    def _fetch(self, endpoint, repo):
+        """
+        Fetch the value for a repository, or the organization if repo is None.
+        """
 
-        # Create or update GitHub Actions secrets for all repositories:
-        if secret_level == "Organization":
-            if secret_visibility == "selected":
-                if secret_type == "Action":
-                    result = apis.actions.ActionsSecrets.update_org_secret_scoped(
-                        base_api_url,
-                        api_headers,
-                        ORGANIZATION_NAME,
-                        secret_name,
-                        action_org_encrypted_value,
-                        action_org_public_key_id,
-                        secret_visibility,
-                        secret_repo_id,
-                    )
-                else:
-                    result = apis.dependabot.DependabotSecrets.update_org_secret_scoped(
-                        base_api_url,
-                        api_headers,
-                        ORGANIZATION_NAME,
-                        secret_name,
-                        dependabot_org_encrypted_value,
-                        dependabot_org_public_key_id,
-                        secret_visibility,
-                        secret_repo_id,
-                    )
-            else:
-                if secret_type == "Action":
-                    result = apis.actions.ActionsSecrets.update_org_secret(
-                        base_api_url,
-                        api_headers,
-                        ORGANIZATION_NAME,
-                        secret_name,
-                        action_org_encrypted_value,
-                        action_org_public_key_id,
-                        secret_visibility,
-                    )
-                else:
-                    result = apis.dependabot.DependabotSecrets.update_org_secret(
-                        base_api_url,
-                        api_headers,
-                        ORGANIZATION_NAME,
-                        secret_name,
-                        dependabot_org_encrypted_value,
-                        dependabot_org_public_key_id,
-                        secret_visibility,
-                    )
-
-        elif secret_level == "Repository":
-            # Retrieve unique action public key and key id pair for an organization:
-            result_repo_action_publickey = (
-                apis.actions.ActionsSecrets.get_repo_public_key(
-                    base_api_url, api_headers, ORGANIZATION_NAME, secret_repo
+    def get(self, repo, secret_type: str):
+        """
+        Get the value for a repository or the organization.
+        """
+        # Rows for the same key wait for a single fetch, other keys are fetched in parallel:
+        with self._lock:
+            key_lock = self._key_locks.setdefault((repo, secret_type), threading.Lock())
+        with key_lock:
+            if (repo, secret_type) not in self._values:
+                self._values[(repo, secret_type)] = self._fetch(
+                    self._endpoints[secret_type], repo
                 )
+            return self._values[(repo, secret_type)]
+
+    def refresh(self, repo, secret_type: str):
+        """
+        Drop a cached value and fetch it again.
+        """
+        self._values.pop((repo, secret_type), None)
+        return self.get(repo, secret_type)
+
+
+class PublicKeyCache(KeyedCache):
+    """
+    Key id and sealed box pairs of the public keys used to encrypt secrets.
+    """
+
+    def _fetch(self, endpoint, repo):
+        """
+        Fetch a public key and build its sealed box.
+        """
+        if repo is None:
+            result = endpoint.get_org_public_key(ORGANIZATION_NAME)
+        else:
+            result = endpoint.get_repo_public_key(ORGANIZATION_NAME, repo)
+        return result["key_id"], seal(result["key"])
+
+
+class LiveSecretsCache(KeyedCache):
+    """
+    Secrets currently set in GitHub, keyed by their upper case name as GitHub
+    stores secret names in upper case.
+    """
+
+    def _fetch(self, endpoint, repo):
+        """
+        Fetch the list of secrets, without their values.
+        """
+        if repo is None:
+            secrets = endpoint.list_org_secrets(ORGANIZATION_NAME)
+        else:
+            secrets = endpoint.list_repo_secrets(ORGANIZATION_NAME, repo)
+        return {secret["name"].upper(): secret for secret in secrets}
+
+
+class SecretSync:
+    """
+    Keyed hashes and scopes of the secrets written by earlier runs. GitHub never
+    returns secret values, so rows are compared against this state and the live
+    secret listings, and only new, changed or re-scoped secrets are written.
+    """
+
+    def __init__(self, path: str, key: str, endpoints: dict):
+        """
+        Initializes the sync with the state file, the key used to hash values and
+        the secret endpoints for each secret type.
+        """
+        self._path = path
+        self._key = key.encode("utf-8")
+        self._live_secrets = LiveSecretsCache(endpoints)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def _fingerprint(self, secret: dict) -> dict:
+        """
+        Get the state entry of a secret: its id, keyed hash and scope.
+        """
+        key_repo, key_type = secret_key(secret)
+        repo_ids = []
+        if secret["level"] == "Organization" and secret["visibility"] == "selected":
+            repo_ids = sorted(map(int, secret["repo_id"].split(";")))
+        return {
+            "id": "/".join(
+                (secret["level"], key_type, key_repo or "", secret["name"].upper())
+            ),
+            "hash": hmac.new(
+                self._key, secret["value"].encode("utf-8"), hashlib.sha256
+            ).hexdigest(),
+            "visibility": (
+                secret["visibility"] if secret["level"] == "Organization" else ""
+            ),
+            "repo_ids": repo_ids,
+        }
+
+    def scope_change(self, secret: dict):
+        """
+        Compare a secret against the state and the live secret listings. Returns
+        None if the secret has to be written, otherwise the repository IDs to add
+        to and remove from its selected repositories, both empty if it is unchanged.
+        """
+        fingerprint = self._fingerprint(secret)
+        entry = self._entries.get(fingerprint["id"])
+        if entry is None or any(
+            entry[field] != fingerprint[field] for field in ("hash", "visibility")
+        ):
+            return None
+        try:
+            live_secret = self._live_secrets.get(*secret_key(secret)).get(
+                secret["name"].upper()
             )
-            action_repo_public_key_id = result_repo_action_publickey["key_id"]
-            action_repo_public_key_32bytes = result_repo_action_publickey["key"]
+        except (requests.exceptions.RequestException, KeyError):
+            return None
+        if live_secret is None:
+            return None
+        if fingerprint["visibility"] and live_secret.get("visibility") not in (
+            None,
+            fingerprint["visibility"],
+        ):
+            return None
+        # A secret updated after it was written by an earlier run was changed elsewhere:
+        if live_secret["updated_at"] > entry["written_at"]:
+            return None
+        added = sorted(set(fingerprint["repo_ids"]) - set(entry["repo_ids"]))
+        removed = sorted(set(entry["repo_ids"]) - set(fingerprint["repo_ids"]))
+        return added, removed
 
-            # Retrieve unique dependabot public key and key id pair for an organization:
-            result_repo_depd_publickey = (
-                apis.dependabot.DependabotSecrets.get_repo_public_key(
-                    base_api_url, api_headers, ORGANIZATION_NAME, secret_repo
-                )
+    def record(self, secret: dict, result):
+        """
+        Record a secret that was written by this run, at the server time of the
+        write response, as it is compared with the updated_at times of GitHub.
+        A response without a Date header is not recorded, so the secret is
+        written again by the next run.
+        """
+        if "Date" not in result.headers:
+            return
+        fingerprint = self._fingerprint(secret)
+        fingerprint["written_at"] = (
+            parsedate_to_datetime(result.headers["Date"])
+            .astimezone(timezone.utc)
+            .strftime("%Y-%m-%dT%H:%M:%SZ")
+        )
+        with self._lock:
+            self._entries[fingerprint.pop("id")] = fingerprint
+
+    def save(self):
+        """
+        Write the state to a temporary file and move it into place, so an
+        interrupted write never leaves a truncated state file behind.
+        """
+        with self._lock:
+            with open(f"{self._path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(f"{self._path}.tmp", self._path)
+
+
+def parse_row(row: dict) -> dict:
+    """
+    Get the secret fields of a row loaded from the CSV file.
+    """
+    # Short rows are missing their last fields:
+    row = {column: row.get(column) or "" for column in PROPERTIES_HEADER}
+    # Remove any white space:
+    return {
+        "level": row["SecretLevel"].replace(" ", ""),
+        "type": row["SecretType"].replace(" ", ""),
+        "name": row["SecretName"].replace(" ", ""),
+        "value": row["SecretValue"].replace(" ", ""),
+        "visibility": row["SecretAccess"].replace(" ", ""),
+        "repo": row["RepositoryName"],
+        "repo_id": row["RepositoryID"],
+    }
+
+
+def coalesce_rows(rows):
+    """
+    Yield repository rows as they are read, and hold back organization rows to
+    yield one row per secret type and name once the file is read. The selected
+    repositories of every row of a secret are merged into that row, so each
+    secret is written once instead of every row overwriting the scope of the last.
+    """
+    org_secrets = {}
+    for row in rows:
+        secret = parse_row(row)
+        if secret["level"] != "Organization" or not secret["name"]:
+            yield row
+            continue
+        planned = org_secrets.setdefault(
+            (secret_key(secret)[1], secret["name"].upper()),
+            {"rows": 0, "value": secret["value"], "repos": {}, "repo_ids": {}},
+        )
+        if planned["value"] != secret["value"]:
+            print(
+                f"Secret {secret['name']} is listed with different values, "
+                "the last one is used."
             )
-            dependabot_repo_public_key_id = result_repo_depd_publickey["key_id"]
-            dependabot_repo_public_key_32bytes = result_repo_depd_publickey["key"]
+        planned["rows"] += 1
+        planned["value"] = secret["value"]
+        planned["row"] = row
+        if secret["visibility"] == "selected":
+            # Keep the first position of every repository, dropping duplicates:
+            planned["repos"].update(dict.fromkeys(secret["repo"].split(";")))
+            planned["repo_ids"].update(dict.fromkeys(secret["repo_id"].split(";")))
+
+    merged_rows = 0
+    for planned in org_secrets.values():
+        row = planned["row"]
+        if planned["rows"] > 1:
+            merged_rows += planned["rows"]
+            row = dict(row)
+            row["RepositoryName"] = ";".join(filter(None, planned["repos"]))
+            row["RepositoryID"] = ";".join(filter(None, planned["repo_ids"]))
+        yield row
+    if merged_rows:
+        print(
+            f"Merged {merged_rows} rows of organization secrets listed more than once."
+        )
 
-            action_repo_encrypted_value = encrypt(
-                action_repo_public_key_32bytes, secret_value
+
+def validate_secret(secret: dict) -> str:
+    """
+    Check a parsed row before uploading it. Returns why the secret can not be
+    uploaded, or an empty string if it can.
+    """
+    secret_name = secret["name"]
+    if secret["level"] not in ("Organization", "Repository") or not secret_name:
+        return f"There was an issue with secret {secret_name}"
+    if secret["type"] not in SECRET_ENDPOINTS:
+        return f"There was an issue with secret {secret_name}: unknown SecretType"
+    if secret["level"] == "Repository" and not secret["repo"]:
+        return f"There was an issue with secret {secret_name}: no RepositoryName"
+    if secret["visibility"] == "selected" and secret["level"] == "Organization":
+        if not all(repo_id.isdigit() for repo_id in secret["repo_id"].split(";")):
+            return f"There was an issue with secret {secret_name}: bad RepositoryID"
+    return ""
+
+
+def write_secret(endpoint, secret: dict, key_id: str, encrypted_value: str):
+    """
+    Create or update an organization or repository secret with an encrypted value.
+    """
+    if secret["level"] == "Repository":
+        return endpoint.update_repo_secret(
+            ORGANIZATION_NAME,
+            secret["repo"],
+            secret["name"],
+            encrypted_value,
+            key_id,
+        )
+    if secret["visibility"] == "selected":
+        return endpoint.update_org_secret_scoped(
+            ORGANIZATION_NAME,
+            secret["name"],
+            encrypted_value,
+            key_id,
+            secret["visibility"],
+            secret["repo_id"],
+        )
+    return endpoint.update_org_secret(
+        ORGANIZATION_NAME,
+        secret["name"],
+        encrypted_value,
+        key_id,
+        secret["visibility"],
+    )
+
+
+def secret_key(secret: dict):
+    """
+    Get the (repository, secret type) of the public key a secret is encrypted
+    with, where the repository is None for organization secrets.
+    """
+    key_type = secret["type"]
+    key_repo = secret["repo"] if secret["level"] == "Repository" else None
+    return key_repo, key_type
+
+
+def update_secret(endpoints: dict, public_keys: PublicKeyCache, secret: dict):
+    """
+    Encrypt a secret once, with the key it is sent with, and create or update it.
+    If the server rejects the request and the key was rotated since it was
+    cached, retry once with the new key.
+    """
+    key_repo, key_type = secret_key(secret)
+    key_id, sealed_box = public_keys.get(key_repo, key_type)
+    result = write_secret(
+        endpoints[key_type], secret, key_id, encrypt(sealed_box, secret["value"])
+    )
+    if result.status_code in STALE_KEY_STATUS_CODES:
+        new_key_id, new_sealed_box = public_keys.refresh(key_repo, key_type)
+        if new_key_id != key_id:
+            result = write_secret(
+                endpoints[key_type],
+                secret,
+                new_key_id,
+                encrypt(new_sealed_box, secret["value"]),
             )
-            dependabot_repo_encrypted_value = encrypt(
-                dependabot_repo_public_key_32bytes, secret_value
+    return result
+
+
+def update_secret_repos(endpoints: dict, secret: dict, added: list, removed: list):
+    """
+    Change the selected repositories of an organization secret whose value is
+    unchanged, without sending the value again. A single added or removed
+    repository has its own endpoint, any other change sets the whole list.
+    """
+    endpoint = endpoints[secret_key(secret)[1]]
+    if len(added) + len(removed) == 1:
+        if added:
+            return endpoint.add_org_secret_repo(
+                ORGANIZATION_NAME, secret["name"], added[0]
             )
-            if secret_type == "Action":
-                result = apis.actions.ActionsSecrets.update_repo_secret(
-                    base_api_url,
-                    api_headers,
-                    ORGANIZATION_NAME,
-                    secret_repo,
-                    secret_name,
-                    action_repo_encrypted_value,
-                    action_repo_public_key_id,
-                )
-            else:
-                result = apis.dependabot.DependabotSecrets.update_repo_secret(
-                    base_api_url,
-                    api_headers,
-                    ORGANIZATION_NAME,
-                    secret_repo,
-                    secret_name,
-                    dependabot_repo_encrypted_value,
-                    dependabot_repo_public_key_id,
-                )
+        return endpoint.remove_org_secret_repo(
+            ORGANIZATION_NAME, secret["name"], removed[0]
+        )
+    return endpoint.set_org_secret_repos(
+        ORGANIZATION_NAME, secret["name"], secret["repo_id"].split(";")
+    )
+
+
+def process_row(
+    endpoints: dict, public_keys: PublicKeyCache, secret_sync, row: dict
+) -> dict:
+    """
+    Create or update the secret of a row loaded from the CSV file and return
+    its status for the results file. With a SecretSync, unchanged secrets are
+    skipped and written secrets are recorded.
+    """
+    secret = parse_row(row)
+    secret_name = secret["name"]
+    status = {
+        "SecretLevel": secret["level"],
+        "SecretType": secret["type"],
+        "SecretName": secret_name,
+        "RepositoryName": secret["repo"],
+        "StatusCode": "",
+        "Status": "failed",
+        "Message": "",
+    }
 
+    status["Message"] = validate_secret(secret)
+    if status["Message"]:
+        return status
+
+    scope_change = None
+    if secret_sync is not None:
+        scope_change = secret_sync.scope_change(secret)
+        if scope_change == ([], []):
+            status["Status"] = "unchanged"
+            status["Message"] = "No changes to an existing value for " + secret_name
+            return status
+
+    try:
+        if scope_change is not None:
+            # Only the selected repositories of an unchanged value are updated:
+            result = update_secret_repos(endpoints, secret, *scope_change)
         else:
-            print(f"There was an issue with secret {secret_name}")
-
-        # Declare messages to print:
-        message = ""
-
-        # If a new GitHub Actions value got created:
-        if result.status_code == 201:
-            message = "Successfully created a new value for " + secret_name
-        # If an existing GitHub Actions value got updated:
-        elif result.status_code == 204:
-            message = "Successfully updated an existing value for " + secret_name
-        # If call fails of whatever reason:
+            # Create or update the secret with the public key of its level and type:
+            result = update_secret(endpoints, public_keys, secret)
+    except (requests.exceptions.RequestException, KeyError) as e:
+        status["Message"] = (
+            "Hmm. Creating or updating a property named '"
+            + secret_name
+            + "' failed with a following error : "
+            + repr(e)
+        )
+        return status
+    status["StatusCode"] = result.status_code
+
+    if secret_sync is not None and result.status_code in (201, 204):
+        secret_sync.record(secret, result)
+
+    # If a new GitHub Actions value got created:
+    if result.status_code == 201:
+        status["Status"] = "created"
+        status["Message"] = "Successfully created a new value for " + secret_name
+    # If an existing GitHub Actions value got updated:
+    elif result.status_code == 204:
+        status["Status"] = "updated"
+        if scope_change is not None:
+            status["Message"] = (
+                "Successfully updated the selected repositories of " + secret_name
+            )
         else:
-            message = (
-                "Hmm. Creating or updating a property named '"
-                + secret_name
-                + "' failed with a following status code : "
-                + str(result.status_code)
+            status["Message"] = (
+                "Successfully updated an existing value for " + secret_name
             )
-        print(message)
+    # If call fails of whatever reason:
+    else:
+        status["Message"] = (
+            "Hmm. Creating or updating a property named '"
+            + secret_name
+            + "' failed with a following status code : "
+            + str(result.status_code)
+        )
+    return status
+
+
+def main():
+    """
+    Orchestrate calls necessary to populate organization and repo secrets based on a given file
+    """
+
+    base_api_url = get_api_url()
+    api_headers = get_headers()
+
+    # Share one pooled keep-alive session and rate limit scheduler between all secret endpoints:
+    session = apis.session.SecretsSession(
+        api_headers, max(POOL_SIZE, WORKERS), REQUEST_TIMEOUT
+    )
+    scheduler = RateLimitScheduler(max_concurrent=WORKERS)
+    endpoints = {
+        secret_type: endpoint(base_api_url, session, scheduler)
+        for secret_type, endpoint in SECRET_ENDPOINTS.items()
+    }
+    public_keys = PublicKeyCache(endpoints)
+
+    # Only write new, changed or re-scoped secrets when syncing against a state file:
+    secret_sync = None
+    if SYNC_STATE_FILE:
+        if not SYNC_STATE_KEY:
+            raise ValueError("SYNC_STATE_KEY must be set to use SYNC_STATE_FILE")
+        secret_sync = SecretSync(SYNC_STATE_FILE, SYNC_STATE_KEY, endpoints)
+
+    # Stream properties that will be added/updated in a wanted organization,
+    # with one row for each organization secret:
+    map_properties = coalesce_rows(read_properties(NAME_PROPERTIES_FILE))
+
+    report_time = datetime.now().isoformat("T", "seconds")
+    results_file = (
+        RESULTS_FILE or f"{report_time}-{ORGANIZATION_NAME}-secrets-results.csv"
+    )
+    status_counts = Counter()
+    with open(results_file, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=RESULTS_HEADER)
+        writer.writeheader()
+
+        # Create/update the secrets loaded from CSV file with WORKERS rows in flight at once:
+        try:
+            with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+                statuses = bounded_map(
+                    executor,
+                    partial(process_row, endpoints, public_keys, secret_sync),
+                    map_properties,
+                    WORKERS * 2,
+                )
+                for status in statuses:
+                    print(status["Message"])
+                    writer.writerow(status)
+                    status_counts[status["Status"]] += 1
+        finally:
+            if secret_sync is not None:
+                secret_sync.save()
+
+    print(
+        f"Created {status_counts['created']}, updated {status_counts['updated']}, "
+        f"skipped {status_counts['unchanged']} unchanged "
+        f"and failed {status_counts['failed']} secrets. Results are in {results_file}."
+    )
 
 
 # Call main function:
@@ -5,83 +5,137 @@ This script runs a report on the enterprise environment to get the following inf
 - last commit per repo
 - number of branches per repo
 - list of forks per repo
-- forks of forks per repo
+- forks of forks per repo, down to any depth
 
 
 Environment Variables:
     API_TOKEN (str): GitHub API token with `read:enterprise`, `read:org` and `repo` applied scopes.
     GHE_HOSTNAME (str): GitHub URL Slug (only needed if using GHES).
     ENTERPRISE (str): GitHub Enterprise name to run report against
+    CONCURRENCY (int): Number of API requests in flight at once (defaults to 10).
+    FORK_DEPTH (int): Levels of forks to crawl, where 2 lists forks and forks of
+        forks (the default) and 0 crawls the whole fork network.
+    BASELINE_REPORT (str): Path of an earlier report. Repos whose updatedAt and
+        pushedAt did not move since are carried over instead of fetched again.
+    HTTP_CACHE_FILE (str): Path of a SQLite file to cache REST responses in between runs.
+    HTTP_CACHE_TTL (float): Seconds a cached response is used without revalidating it
+        (defaults to 0).
+    HTTP_CACHE_MAX_MB (int): Megabytes of cached responses kept before evicting
+        (defaults to 100).
+    GITHUB_API_URL (str): REST API URL to use instead of the one of GHE_HOSTNAME,
+        such as a local test server.
+    GITHUB_GRAPHQL_URL (str): GraphQL API URL to use instead of the one of GHE_HOSTNAME.
 """
 
+import asyncio
 import json
 import os
+import sys
 from datetime import datetime
 
-import requests
 from dotenv import load_dotenv  # Import if you want to use .env file
-from octopy_admin.graph.graph_client import GraphClient, GraphClientError
-from octopy_admin.rest.rest_client import RestClient, RestClientError
-
-load_dotenv()
+from octopy_admin.graph.graph_client import GraphClientError
+from octopy_admin.rest.rest_client import RestClientError
 
+# Make the helpers shared by the scripts in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from common.async_client import AsyncGitHubClient  # noqa: E402
+from common.http_cache import ResponseCache  # noqa: E402
+from common.rate_limit import RateLimitScheduler  # noqa: E402
 
-# Create a new RestClient and GraphClient object and set the API_TOKEN and the GHE_HOSTNAME variables for GHES
+load_dotenv()
 
 
-github_rest = RestClient()
-graph_github = GraphClient()
 time = datetime.now()
 enterprise_name = os.getenv("ENTERPRISE")
+concurrency = int(os.getenv("CONCURRENCY", "10"))
+api_url = os.getenv("GITHUB_API_URL")
+graph_url = os.getenv("GITHUB_GRAPHQL_URL")
+fork_depth = int(os.getenv("FORK_DEPTH", "2"))
+baseline_report = os.getenv("BASELINE_REPORT")
+http_cache_file = os.getenv("HTTP_CACHE_FILE")
+http_cache_ttl = float(os.getenv("HTTP_CACHE_TTL", "0"))
+http_cache_max_mb = int(os.getenv("HTTP_CACHE_MAX_MB", "100"))
 
 
 # Helper methods to generate report for enterprise
 
 
-def get_orgs(enterprise):
+def load_query(file_name):
+    """
+    Load a GraphQL query stored next to this script.
+    """
+    with open(
+        os.path.join(os.path.dirname(__file__), file_name), encoding="utf8"
+    ) as file:
+        return file.read()
+
+
+async def paginate_nodes(client, query, params, connection):
+    """
+    Follow the pages of a GraphQL connection and return all of its nodes.
+    Attributes:
+        client (obj): AsyncGitHubClient.
+        query (str): GraphQL query taking a $cursor variable.
+        params (dict): Query variables.
+        connection (tuple): Keys leading to the connection in the query results.
+    """
+    nodes = []
+    params = {**params, "cursor": None}
+    while True:
+        results = await client.graphql(query, params)
+        for key in connection:
+            results = results[key]
+        nodes.extend(results["nodes"])
+        if not results["pageInfo"]["hasNextPage"]:
+            return nodes
+        params["cursor"] = results["pageInfo"]["endCursor"]
+
+
+async def get_orgs(client, enterprise):
     """
     Get the list of orgs.
     """
     try:
-        results = graph_github.query.get_enterprise_orgs(enterprise)
-        org_list = graph_github.query.results_to_list(results)
-        return org_list
+        return await paginate_nodes(
+            client,
+            load_query("get-enterprise-orgs.graphql"),
+            {"slug": enterprise},
+            ("enterprise", "organizations"),
+        )
     except GraphClientError as e:
         print(e)
+        return []
 
 
-def get_repos(org):
+async def get_repos(client, org):
     """
     Get the list of repos.
     """
     try:
-        results = graph_github.query.get_org_repos(org)
-        repo_list = graph_github.query.results_to_list(results)
-        return repo_list
+        return await paginate_nodes(
+            client,
+            load_query("get-org-repos.graphql"),
+            {"organization": org},
+            ("organization", "repositories"),
+        )
     except GraphClientError as e:
         print(e)
+        return []
 
 
-def get_last_commit(org, name):
+async def get_last_commit(client, org, name):
     """
     Get the last commit for a repo.
     """
-    api_token = os.environ.get("API_TOKEN")
-    if os.environ.get("API_TOKEN") is None:
-        raise RestClientError("API_TOKEN environment variable is not set")
-    headers = {"Authorization": f"Bearer {api_token}"}
-    hostname = os.environ.get("GHE_HOSTNAME")
-    if os.environ.get("GHE_HOSTNAME") is None:
-        rest_api_url = "https://api.github.com"
-    else:
-        rest_api_url = "https://" + hostname + "/api/v3"
-    url = rest_api_url + f"/repos/{org}/{name}/commits"
-    commit_response = requests.request(
-        method="get",
-        url=url,
-        headers=headers,
-        timeout=10,
-    )
+    try:
+        commit_response = await client.request(
+            "get", f"/repos/{org}/{name}/commits", params={"per_page": "1"}
+        )
+    except RestClientError as e:
+        print(e)
+        return []
     if not commit_response:
         last_commit = []
     else:
@@ -90,84 +144,228 @@ def get_last_commit(org, name):
     return last_commit
 
 
-def get_branch_count(org, name):
+async def get_branch_count(client, org, name):
     """
     Get the number of branches for a repo.
     """
     try:
-        branches = github_rest.repos.list_branches(org, name)
-        num_branches = len(branches.json())
+        # Only the number of pages of a single branch is read, not the branches:
+        num_branches = await client.count(f"/repos/{org}/{name}/branches")
         return num_branches
     except RestClientError as e:
         print(e)
 
 
-def get_fork_list(org, name):
+def fork_info(fork):
+    """
+    Get the fields of a fork kept in the report.
     """
-    Get the list of forked repos for a repo and children forks.
+    return {
+        "name": fork["name"],
+        "full_name": fork["full_name"],
+        "owner_login": fork["owner"]["login"],
+        "fork_count": fork["forks_count"],
+    }
+
+
+async def list_forks(client, url):
+    """
+    Get every page of a fork listing, or None if it can not be listed.
     """
     try:
-        fork_raw = github_rest.repos.list_forks(
-            org,
-            name,
-            params={
-                "page": "1",
-                "per_page": "100",
-            },
-        )
-        fork_pages = fork_raw.json()
-        while fork_raw.links.get("next") != fork_raw.links.get("last"):
-            url = fork_raw.links.get("next").get("url")
-            fork_raw = github_rest._execute("GET", url)
-            raw = fork_raw.json()
-            fork_pages.extend(raw)
-        fork_list = []
-        for index, fork in enumerate(fork_pages):
-            fork_name = fork["name"]
-            fork_full_name = fork["full_name"]
-            owner_name = fork["owner"]["login"]
-            fork_count = fork["forks_count"]
-            fork_list.append(
-                {
-                    "name": fork_name,
-                    "full_name": fork_full_name,
-                    "owner_login": owner_name,
-                    "fork_count": fork_count,
-                    "fork_children_info": [],
-                }
-            )
-            if fork_count > 0:
-                new_fork_url = fork["forks_url"]
-                api_token = os.environ.get("API_TOKEN")
-                headers = {"Authorization": f"Bearer {api_token}"}
-                fork_forks = requests.request(
-                    method="get",
-                    url=new_fork_url,
-                    headers=headers,
-                    timeout=10,
-                    params={
-                        "page": "1",
-                        "per_page": "100",
-                    },
-                )
-                if fork_forks:
-                    fork_forks_response = fork_forks.json()
-                    for fork_child in fork_forks_response:
-                        fork_fork_name = fork_child["name"]
-                        fork_fork_full_name = fork_child["full_name"]
-                        fork_owner_name = fork_child["owner"]["login"]
-                        fork_fork_count = fork_child["forks_count"]
-                        fork_list[index]["fork_children_info"].append(
-                            {
-                                "name": fork_fork_name,
-                                "full_name": fork_fork_full_name,
-                                "owner_login": fork_owner_name,
-                                "fork_count": fork_fork_count,
-                            }
-                        )
-        return fork_list
+        return await client.paginate(url)
     except RestClientError as e:
         print(e)
+        return None
+
+
+async def get_fork_list(client, org, name):
+    """
+    Get the list of forked repos for a repo and children forks, crawling the
+    fork network breadth first down to FORK_DEPTH levels. The forks of every
+    repo on a level are listed at the same time, and a repo that is met again
+    is never listed twice.
+    """
+    fork_list = []
+    seen = {f"{org}/{name}"}
+    level = [(f"/repos/{org}/{name}/forks", fork_list)]
+    depth = 1
+    while level:
+        fork_pages = await asyncio.gather(
+            *(list_forks(client, forks_url) for forks_url, _ in level)
+        )
+        if depth == 1 and fork_pages[0] is None:
+            return None
+        # Forks on the last level are listed without their children:
+        crawl_children = not fork_depth or depth < fork_depth
+        next_level = []
+        for (_, siblings), forks in zip(level, fork_pages):
+            for fork in forks or []:
+                if fork["full_name"] in seen:
+                    continue
+                seen.add(fork["full_name"])
+                fork_entry = fork_info(fork)
+                siblings.append(fork_entry)
+                if depth == 1 or crawl_children:
+                    fork_entry["fork_children_info"] = []
+                if crawl_children and fork["forks_count"] > 0:
+                    next_level.append(
+                        (fork["forks_url"], fork_entry["fork_children_info"])
+                    )
+        level = next_level
+        depth += 1
+    return fork_list
+
+
+def load_baseline(path):
+    """
+    Load the repos of an earlier report, keyed by org name and then repo name.
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {
+            org["org_name"]: {repo["name"]: repo for repo in org["repos"]}
+            for org in json.load(f)
+        }
+
+
+def is_unchanged(previous, repo):
+    """
+    Check if a repo was neither updated nor pushed to since an earlier report.
+    """
+    return (
+        previous is not None
+        and previous["updated_at"] == repo["updatedAt"]
+        and previous.get("pushed_at") == repo["pushedAt"]
+    )
+
+
+async def get_repo_network(client, org_name, repo, previous=None):
+    """
+    Get the last commit, branch count and forks of a repo at the same time,
+    or its entry of an earlier report if it is unchanged since.
+    """
+    if is_unchanged(previous, repo):
+        return previous
+    repo_name = repo["name"]
+    repo_last_commit, repo_branch_count, repo_fork_list = await asyncio.gather(
+        get_last_commit(client, org_name, repo_name),
+        get_branch_count(client, org_name, repo_name),
+        get_fork_list(client, org_name, repo_name),
+    )
+    if not repo_branch_count:
+        repo_branch_count = []
+    return {
+        "name": repo_name,
+        "updated_at": repo["updatedAt"],
+        "pushed_at": repo["pushedAt"],
+        "last_commit": repo_last_commit,
+        "num_branches": repo_branch_count,
+        "forks": repo_fork_list,
+    }
+
+
+async def get_repo_network_from_page(client, org_name, repo, previous=None):
+    """
+    Get the network of a repo from its get-org-repo-networks.graphql node, only
+    listing its forks over REST when the node counts any. The forks of an
+    earlier report are kept if the repo and its fork count are unchanged since.
+    """
+    last_commit = []
+    target = (repo["defaultBranchRef"] or {}).get("target") or {}
+    history = target.get("history", {}).get("nodes")
+    if history:
+        last_commit = history[0]["author"]
+    repo_fork_list = []
+    if repo["forks"]["totalCount"] > 0:
+        if is_unchanged(previous, repo) and (
+            len(previous["forks"] or []) == repo["forks"]["totalCount"]
+        ):
+            repo_fork_list = previous["forks"]
+        else:
+            repo_fork_list = await get_fork_list(client, org_name, repo["name"])
+    return {
+        "name": repo["name"],
+        "updated_at": repo["updatedAt"],
+        "pushed_at": repo["pushedAt"],
+        "last_commit": last_commit,
+        "num_branches": repo["refs"]["totalCount"] or [],
+        "forks": repo_fork_list,
+    }
+
+
+async def get_org_network(client, org, baseline=None):
+    """
+    Get the networks of all repos of an org. The last commit, branch count and
+    fork count of a whole page of repos come from one GraphQL query, and only
+    repos with forks are listed further over REST. If the query fails, every
+    repo is collected over REST instead. Repos of the baseline, the org's
+    repos in an earlier report, are only fetched again if they changed since.
+    """
+    baseline = baseline or {}
+    org_name = org["login"]
+    try:
+        org_repo = await paginate_nodes(
+            client,
+            load_query("get-org-repo-networks.graphql"),
+            {"organization": org_name},
+            ("organization", "repositories"),
+        )
+        get_network = get_repo_network_from_page
+    except GraphClientError as e:
+        print(f"{e}, collecting the repos of {org_name} over REST instead.")
+        org_repo = await get_repos(client, org_name)
+        get_network = get_repo_network
+    if baseline:
+        unchanged = sum(
+            is_unchanged(baseline.get(repo["name"]), repo) for repo in org_repo
+        )
+        print(f"{unchanged} of {len(org_repo)} repos of {org_name} are unchanged.")
+    repos = await asyncio.gather(
+        *(
+            get_network(client, org_name, repo, baseline.get(repo["name"]))
+            for repo in org_repo
+        )
+    )
+    return {"org_name": org_name, "repos": list(repos)}
+
+
+async def collect_report(client, enterprise, baseline=None):
+    """
+    Collect the networks of all orgs of an enterprise, with every org and repo
+    fetched concurrently up to the in-flight request limit of the client.
+    Unchanged repos of a baseline loaded with load_baseline are carried over.
+    """
+    baseline = baseline or {}
+    org_list = await get_orgs(client, enterprise)
+    print(f"Found {len(org_list)} organizations in the {enterprise} enterprise.")
+    org_repo_forks = await asyncio.gather(
+        *(get_org_network(client, org, baseline.get(org["login"])) for org in org_list)
+    )
+    return list(org_repo_forks)
+
+
+async def collect_enterprise(enterprise, baseline=None):
+    """
+    Open a client limited to CONCURRENCY requests in flight and collect the
+    networks of an enterprise. REST responses are revalidated with their ETag
+    when HTTP_CACHE_FILE is set.
+    """
+    scheduler = RateLimitScheduler(max_concurrent=concurrency)
+    response_cache = None
+    if http_cache_file:
+        response_cache = ResponseCache(
+            http_cache_file, http_cache_ttl, http_cache_max_mb * 1024 * 1024
+        )
+    async with AsyncGitHubClient(
+        api_url=api_url,
+        graph_url=graph_url,
+        max_in_flight=concurrency,
+        scheduler=scheduler,
+        cache=response_cache,
+    ) as client:
+        return await collect_report(client, enterprise, baseline)
 
 
 def generate_report(enterprise):
@@ -177,30 +375,8 @@ def generate_report(enterprise):
     Output: JSON file with report.
     """
     print(f"Generating report for the {enterprise} enterprise...")
-    org_list = get_orgs(enterprise)
-    print(f"Found {len(org_list)} organizations in the {enterprise} enterprise.")
-    org_repo_forks = []
-    for index, org in enumerate(org_list):
-        org_name = org["login"]
-        org_repo = get_repos(org_name)
-        org_repo_forks.append({"org_name": org_name, "repos": []})
-        for repo in org_repo:
-            repo_name = repo["name"]
-            repo_updated_at = repo["updatedAt"]
-            repo_last_commit = get_last_commit(org_name, repo_name)
-            repo_branch_count = get_branch_count(org_name, repo_name)
-            if not repo_branch_count:
-                repo_branch_count = []
-            repo_fork_list = get_fork_list(org_name, repo_name)
-            org_repo_forks[index]["repos"].append(
-                {
-                    "name": repo_name,
-                    "updated_at": repo_updated_at,
-                    "last_commit": repo_last_commit,
-                    "num_branches": repo_branch_count,
-                    "forks": repo_fork_list,
-                }
-            )
+    baseline = load_baseline(baseline_report)
+    org_repo_forks = asyncio.run(collect_enterprise(enterprise, baseline))
     report_time = datetime.now()
     report_time = time.isoformat("T", "seconds")
     with open(
@@ -211,4 +387,5 @@ def generate_report(enterprise):
         json.dump(org_repo_forks, f, ensure_ascii=False, indent=4)
 
 
-generate_report(enterprise_name)
+if __name__ == "__main__":
+    generate_report(enterprise_name)
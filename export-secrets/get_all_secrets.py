@@ -9,24 +9,79 @@ Environment Variables:
     API_TOKEN (str): GitHub API token.
     GHE_HOSTNAME (str): GitHub URL Slug (only needed if using GHES).
     organization (str): GitHub Organization name to run report against
+    CONCURRENCY (int): Number of repositories to collect secrets for in parallel (default 1)
+    SCOPE_CONCURRENCY (int): Number of selected org secrets to list the repositories of in parallel (default 10)
+    CHECKPOINT_FILE (str): Path of the checkpoint used to resume an unfinished report
+    SKIP_REPOS (str): Comma separated kinds of repos to skip for repo level secrets: archived, disabled, empty
+    HTTP_CACHE_FILE (str): Path of a SQLite file to cache REST responses in between runs
+    HTTP_CACHE_TTL (float): Seconds a cached response is used without revalidating it (default 0)
+    HTTP_CACHE_MAX_MB (int): Megabytes of cached responses kept before evicting (default 100)
 """
 
 import csv
+import json
 import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
 from dotenv import load_dotenv  # Import if you want to use .env file
-from octopy_admin.graph.graph_client import GraphClient, GraphClientError
-from octopy_admin.rest.rest_client import RestClient, RestClientError
+from octopy_admin.graph.graph_client import GraphClientError
+from octopy_admin.rest.rest_client import RestClientError
+
+# Make the helpers shared by the scripts in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from common.clients import ScheduledGraphClient, ScheduledRestClient  # noqa: E402
+from common.concurrency import bounded_map  # noqa: E402
+from common.http_cache import ResponseCache  # noqa: E402
+from common.rate_limit import RateLimitScheduler  # noqa: E402
 
 load_dotenv()
 
-# Create a new RestClient and GraphClient object and set the API_TOKEN and the GHE_HOSTNAME variables for GHES
+organization = os.getenv("organization")
+concurrency = int(os.getenv("CONCURRENCY", "1"))
+scope_concurrency = int(os.getenv("SCOPE_CONCURRENCY", "10"))
+http_cache_file = os.getenv("HTTP_CACHE_FILE")
+http_cache_ttl = float(os.getenv("HTTP_CACHE_TTL", "0"))
+http_cache_max_mb = int(os.getenv("HTTP_CACHE_MAX_MB", "100"))
 
-github_rest = RestClient()
-github_graph = GraphClient()
+# Create a new RestClient and GraphClient object and set the API_TOKEN and the GHE_HOSTNAME variables for GHES
+# Both clients share one scheduler, which paces requests to stay under the rate limits
+# REST responses are revalidated with their ETag when HTTP_CACHE_FILE is set
+
+# It allows the larger of CONCURRENCY and SCOPE_CONCURRENCY in flight, each stage keeps to its own
+scheduler = RateLimitScheduler(max_concurrent=max(concurrency, scope_concurrency))
+response_cache = None
+if http_cache_file:
+    response_cache = ResponseCache(
+        http_cache_file, http_cache_ttl, http_cache_max_mb * 1024 * 1024
+    )
+github_rest = ScheduledRestClient(scheduler, response_cache)
+github_graph = ScheduledGraphClient(scheduler)
 time = datetime.now()
-organization = os.getenv("organization")
+checkpoint_file = os.getenv("CHECKPOINT_FILE")
+skip_repos = [
+    skip.strip() for skip in os.getenv("SKIP_REPOS", "").split(",") if skip.strip()
+]
+
+# Status codes of repo secret listings that fail the same way on every run
+PERMANENT_STATUS_CODES = (403, 404)
+
+# Number of repositories written to the report between flushes of the report and checkpoint
+FLUSH_INTERVAL = 50
+
+# SKIP_REPOS values and the get-org-repo-list.graphql field each one checks
+SKIP_REPO_FIELDS = {
+    "archived": "isArchived",
+    "disabled": "isDisabled",
+    "empty": "isEmpty",
+}
+for skip in skip_repos:
+    if skip not in SKIP_REPO_FIELDS:
+        raise ValueError(f"Unknown SKIP_REPOS value: {skip}")
 
 
 # Helper methods to generate report for the organization
@@ -44,33 +99,76 @@ def get_repos(org):
         print(e)
 
 
-def get_repos_with_visibility(org):
+def get_repos_with_visibility(org, cursor=None):
     """
-    This module returns a generator that will yield a dictionary
-    of all repositories in an organization.
+    This module returns a generator that will yield each page of
+    repositories in an organization, with the cursor that ends the page.
     Attributes:
         org (str): The name of the Organization.
+        cursor (str): The cursor to start after, None starts at the first page.
     """
     absolute_path = os.path.dirname(__file__)
     relative_path = "get-org-repo-list.graphql"
     full_path = os.path.join(absolute_path, relative_path)
     repo_query = github_graph._load_query(full_path)
-    params = {"organization": org, "cursor": None}
-    return github_graph.query._paginate_results(repo_query, params)
-
-
-def list_repo_visibility(org):
+    params = {"organization": org, "cursor": cursor}
+    while True:
+        results = github_graph._execute(repo_query, params)
+        repositories = results["organization"]["repositories"]
+        page_info = repositories["pageInfo"]
+        yield repositories["nodes"], page_info["endCursor"]
+        if not page_info["hasNextPage"]:
+            return
+        params["cursor"] = page_info["endCursor"]
+
+
+def list_repo_visibility(org, cursor=None):
     """
-    Get the list of repos and include repository visibility.
+    Get the pages of repos after the cursor and include repository visibility.
     """
     try:
-        results = get_repos_with_visibility(org)
-        full_repo_list = github_graph.query.results_to_list(results)
-        return full_repo_list
+        repo_pages = list(get_repos_with_visibility(org, cursor))
+        return repo_pages
     except GraphClientError as e:
         print(e)
 
 
+def index_repos_by_visibility(org_repos):
+    """
+    Group the list of repos by their visibility, so secrets scoped to
+    private repositories can be expanded without querying the repos again.
+    """
+    repo_index = defaultdict(list)
+    for org_repo in org_repos:
+        repo_index[org_repo["visibility"]].append(org_repo)
+    return repo_index
+
+
+def skip_repo(org_repo):
+    """
+    Check if a repo is excluded from repo level secret collection by SKIP_REPOS.
+    """
+    return any(org_repo[SKIP_REPO_FIELDS[skip]] for skip in skip_repos)
+
+
+def list_selected_repos(list_selected, org, secret):
+    """
+    Get every repository an organization secret is scoped to, following the
+    pages of the selected repositories listing.
+    Attributes:
+        list_selected (callable): list_selected_repositories_for_an_organization_secret
+            of the Actions, Dependabot or Codespaces API.
+        org (str): The name of the Organization.
+        secret (str): The name of the secret.
+    """
+    response = list_selected(org, secret, params={"per_page": 100})
+    selected_repos = response.json()["repositories"]
+    while response.links.get("next"):
+        response = github_rest._execute("GET", response.links["next"]["url"])
+        selected_repos.extend(response.json()["repositories"])
+    return selected_repos
+
+
 # Action specific secrets functions
 
 
@@ -89,27 +187,23 @@ def org_action_secrets(org):
 def repo_action_secrets(org, repo):
     """
     Get the list of repo Action secrets.
+    Raises RestClientError if they can not be listed.
     """
-    try:
-        repo_action_secret = github_rest.actions.list_repository_secrets(org, repo)
-        repo_action_secret = repo_action_secret.json()
-        return repo_action_secret
-    except RestClientError as e:
-        print(e)
+    repo_action_secret = github_rest.actions.list_repository_secrets(org, repo)
+    repo_action_secret = repo_action_secret.json()
+    return repo_action_secret
 
 
 def scoped_org_action_secrets(org, secret):
     """
-    Get the list of repo Or secrets.
+    Get every repository an organization Action secret is scoped to.
     """
     try:
-        org_repo_action_secret = (
-            github_rest.actions.list_selected_repositories_for_an_organization_secret(
-                org, secret
-            )
+        return list_selected_repos(
+            github_rest.actions.list_selected_repositories_for_an_organization_secret,
+            org,
+            secret,
         )
-        org_repo_action_secret = org_repo_action_secret.json()
-        return org_repo_action_secret
     except RestClientError as e:
         print(e)
 
@@ -132,25 +226,23 @@ def org_dependabot_secrets(org):
 def repo_dependabot_secrets(org, repo):
     """
     Get the list of repo Dependabot secrets.
+    Raises RestClientError if they can not be listed.
     """
-    try:
-        repo_dep_secret = github_rest.dependabot.list_repository_secrets(org, repo)
-        repo_dep_secret = repo_dep_secret.json()
-        return repo_dep_secret
-    except RestClientError as e:
-        print(e)
+    repo_dep_secret = github_rest.dependabot.list_repository_secrets(org, repo)
+    repo_dep_secret = repo_dep_secret.json()
+    return repo_dep_secret
 
 
 def scoped_org_dependabot_secrets(org, secret):
     """
-    Get the list of repo Dependabot secrets.
+    Get every repository an organization Dependabot secret is scoped to.
     """
     try:
-        org_repo_dep_secret = github_rest.dependabot.list_selected_repositories_for_an_organization_secret(
-            org, secret
+        return list_selected_repos(
+            github_rest.dependabot.list_selected_repositories_for_an_organization_secret,
+            org,
+            secret,
         )
-        org_repo_dep_secret = org_repo_dep_secret.json()
-        return org_repo_dep_secret
     except RestClientError as e:
         print(e)
 
@@ -173,273 +265,332 @@ def org_codespaces_secrets(org):
 def repo_codespaces_secrets(org, repo):
     """
     Get the list of repo Codespaces secrets.
+    Raises RestClientError if they can not be listed.
     """
-    try:
-        repo_cs_secret = github_rest.codespaces.list_repository_secrets(org, repo)
-        repo_cs_secret = repo_cs_secret.json()
-        return repo_cs_secret
-    except RestClientError as e:
-        print(e)
+    repo_cs_secret = github_rest.codespaces.list_repository_secrets(org, repo)
+    repo_cs_secret = repo_cs_secret.json()
+    return repo_cs_secret
 
 
 def scoped_org_codespace_secrets(org, secret):
     """
-    Get the list of repo Codespaces secrets.
+    Get every repository an organization Codespaces secret is scoped to.
     """
     try:
-        org_repo_cd_secret = github_rest.codespaces.list_selected_repositories_for_an_organization_secret(
-            org, secret
+        return list_selected_repos(
+            github_rest.codespaces.list_selected_repositories_for_an_organization_secret,
+            org,
+            secret,
         )
-        org_repo_cd_secret = org_repo_cd_secret.json()
-        return org_repo_cd_secret
     except RestClientError as e:
         print(e)
 
 
+# Checkpoint handling
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Load the checkpoint of a previous unfinished run, if there is one.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """
+    Write the checkpoint to a temporary file and move it into place, so an
+    interrupted write never leaves a truncated checkpoint behind.
+    """
+    with open(f"{checkpoint_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+
+
+def checkpoint_report(csvfile, checkpoint_path, checkpoint):
+    """
+    Flush the report and save the checkpoint with the size of the report, so a
+    resumed run drops the rows written after it.
+    """
+    csvfile.flush()
+    checkpoint["report_size"] = os.path.getsize(checkpoint["report"])
+    save_checkpoint(checkpoint_path, checkpoint)
+
+
 # Report Creation
 
 
-def org_repo_secrets_report(org):
+def is_permanent_error(error):
     """
-    Generate a report for organization and repository levels list of secrets.
-    Input: organization name.
-    Output: CSV file with report.
+    Check if a failed request was answered with a status code a rerun would get
+    again, such as a repo blocked for the token or one that no longer exists,
+    rather than an expired token, a server error, a rate limit or a timeout.
     """
-    print(f"Generating secrets report for the {org} organization...")
-    report_time = datetime.now()
-    report_time = time.isoformat("T", "seconds")
-    org_repos = list_repo_visibility(org)
-    secret_rows = []
-
-    print("Gathering Action secrets.")
-    org_action_secret_list = org_action_secrets(org)
-    org_action_secret_list = org_action_secret_list["secrets"]
-    for action_secret in org_action_secret_list:
-        act_secret_name = action_secret["name"]
-        act_secret_visibility = action_secret["visibility"]
-        if act_secret_visibility == "selected":
-            scoped_repo_list = scoped_org_action_secrets(org, act_secret_name)
-            scoped_repo_list = scoped_repo_list["repositories"]
-            for scope_list in scoped_repo_list:
-                scope_repo_name = scope_list["name"]
-                scope_repo_id = scope_list["id"]
-                secret_rows.append(
-                    [
-                        "Organization",
-                        "Action",
-                        act_secret_name,
-                        act_secret_visibility,
-                        scope_repo_name,
-                        scope_repo_id,
-                    ]
-                )
-        elif act_secret_visibility == "private":
-            private_repo_list = list_repo_visibility(org)
-            for private_repo in private_repo_list:
-                private_repo_name = private_repo["name"]
-                private_repo_id = private_repo["databaseId"]
-                private_repo_visibility = private_repo["visibility"]
-            if (
-                private_repo_visibility == "PRIVATE"
-                or private_repo_visibility == "INTERNAL"
-            ):
-                secret_rows.append(
-                    [
-                        "Organization",
-                        "Action",
-                        act_secret_name,
-                        act_secret_visibility,
-                        private_repo_name,
-                        private_repo_id,
-                    ]
-                )
-        else:
-            secret_rows.append(
-                [
-                    "Organization",
-                    "Action",
-                    act_secret_name,
-                    act_secret_visibility,
-                    "all_repositories",
-                    "NA",
-                ]
-            )
+    response = getattr(error.__cause__, "response", None)
+    if response is None or response.status_code not in PERMANENT_STATUS_CODES:
+        return False
+    return (
+        response.headers.get("X-RateLimit-Remaining") != "0"
+        and "rate limit" not in response.text.lower()
+    )
+
+
+def repo_secret_list(list_secrets, org, repo):
+    """
+    Get the secrets of a repo with one of the repo_*_secrets functions. A
+    permanent error is printed and the repo counted as having none of them,
+    any other error is raised.
+    """
+    try:
+        return list_secrets(org, repo)["secrets"]
+    except RestClientError as e:
+        if not is_permanent_error(e):
+            raise
+        print(e)
+        return []
+
+
+def repo_secrets(org, org_repo):
+    """
+    Get the Action, Dependabot and Codespaces secrets of a single repo.
+    Input: organization name and repository node from the GraphQL query.
+    Output: list of report rows for the repository.
+    Raises RestClientError if any of the secrets could not be listed for a
+    reason a rerun can fix, so the repo is not recorded as completed without them.
+    """
+    repo_name = org_repo["name"]
+    repo_id = org_repo["databaseId"]
+    repo_rows = []
+    repo_action_secret_list = repo_secret_list(repo_action_secrets, org, repo_name)
+    for repo_action_secret in repo_action_secret_list:
+        repo_action_secret_name = repo_action_secret["name"]
+        repo_rows.append(
+            [
+                "Repository",
+                "Action",
+                repo_action_secret_name,
+                "repo",
+                repo_name,
+                repo_id,
+            ]
+        )
+    repo_dependabot_secrets_list = repo_secret_list(
+        repo_dependabot_secrets, org, repo_name
+    )
+    for repo_dep_secret in repo_dependabot_secrets_list:
+        repo_dep_secret_name = repo_dep_secret["name"]
+        repo_rows.append(
+            [
+                "Repository",
+                "Dependabot",
+                repo_dep_secret_name,
+                "repo",
+                repo_name,
+                repo_id,
+            ]
+        )
+    repo_codespace_secrets_list = repo_secret_list(
+        repo_codespaces_secrets, org, repo_name
+    )
+    for repo_codespace_secret in repo_codespace_secrets_list:
+        repo_codespace_secret_name = repo_codespace_secret["name"]
+        repo_rows.append(
+            [
+                "Repository",
+                "Codespaces",
+                repo_codespace_secret_name,
+                "repo",
+                repo_name,
+                repo_id,
+            ]
+        )
+    return repo_rows
 
-    print("Gathering Dependabot secrets.")
-    org_dependabot_secrets_list = org_dependabot_secrets(org)
-    org_dependabot_secrets_list = org_dependabot_secrets_list["secrets"]
-    for dependabot_secret in org_dependabot_secrets_list:
-        dep_secret_name = dependabot_secret["name"]
-        dep_secret_visibility = dependabot_secret["visibility"]
-        if dep_secret_visibility == "selected":
-            dep_scoped_repo_list = scoped_org_action_secrets(org, dep_secret_name)
-            dep_scoped_repo_list = dep_scoped_repo_list["repositories"]
-            for dep_scope_list in dep_scoped_repo_list:
-                dep_scoped_repo_name = dep_scope_list["name"]
-                dep_scoped_repo_id = dep_scope_list["id"]
-                secret_rows.append(
-                    [
+
+# Organization secret types, the function listing them and the function
+# expanding the repositories of a secret with the selected visibility
+ORG_SECRET_TYPES = (
+    ("Action", org_action_secrets, scoped_org_action_secrets),
+    ("Dependabot", org_dependabot_secrets, scoped_org_dependabot_secrets),
+    ("Codespaces", org_codespaces_secrets, scoped_org_codespace_secrets),
+)
+
+
+def expand_selected_secrets(org, selected_secrets):
+    """
+    Get the repositories of every organization secret with the selected
+    visibility, listing them for all secrets concurrently.
+    Input: organization name and the (secret type, secret name) pairs to expand.
+    Output: dictionary of the list of repositories by (secret type, secret name).
+    """
+    scoped_secret_functions = {
+        secret_type: scoped_secrets
+        for secret_type, _, scoped_secrets in ORG_SECRET_TYPES
+    }
+    # A secret is only expanded once, however many times it is listed
+    selected_secrets = list(dict.fromkeys(selected_secrets))
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(selected_secrets), scope_concurrency))
+    ) as executor:
+        selected_repo_lists = executor.map(
+            lambda selected: scoped_secret_functions[selected[0]](org, selected[1]),
+            selected_secrets,
+        )
+        return dict(zip(selected_secrets, selected_repo_lists))
+
+
+def org_secrets(org, private_repos):
+    """
+    Generate the organization level Action, Dependabot and Codespaces secrets rows.
+    Input: organization name and the list of private and internal repositories.
+    Output: generator of report rows.
+    """
+    org_secret_lists = []
+    for secret_type, list_secrets, _ in ORG_SECRET_TYPES:
+        print(f"Gathering {secret_type} secrets.")
+        org_secret_lists.append((secret_type, list_secrets(org)["secrets"]))
+
+    print("Gathering the repositories of secrets scoped to selected repositories.")
+    selected_repos = expand_selected_secrets(
+        org,
+        [
+            (secret_type, org_secret["name"])
+            for secret_type, org_secret_list in org_secret_lists
+            for org_secret in org_secret_list
+            if org_secret["visibility"] == "selected"
+        ],
+    )
+
+    for secret_type, org_secret_list in org_secret_lists:
+        for org_secret in org_secret_list:
+            secret_name = org_secret["name"]
+            secret_visibility = org_secret["visibility"]
+            if secret_visibility == "selected":
+                # Secrets whose repositories could not be listed have no rows
+                for scope_repo in selected_repos[(secret_type, secret_name)] or []:
+                    yield [
                         "Organization",
-                        "Dependabot",
-                        dep_secret_name,
-                        dep_secret_visibility,
-                        dep_scoped_repo_name,
-                        dep_scoped_repo_id,
+                        secret_type,
+                        secret_name,
+                        secret_visibility,
+                        scope_repo["name"],
+                        scope_repo["id"],
                     ]
-                )
-        elif dep_secret_visibility == "private":
-            dep_private_repo_list = list_repo_visibility(org)
-            for dep_private_repo in dep_private_repo_list:
-                dep_private_repo_name = dep_private_repo["name"]
-                dep_private_repo_id = dep_private_repo["databaseId"]
-                dep_private_repo_visibility = dep_private_repo["visibility"]
-            if (
-                dep_private_repo_visibility == "PUBLIC"
-                or dep_private_repo_visibility == "INTERNAL"
-            ):
-                secret_rows.append(
-                    [
+            elif secret_visibility == "private":
+                for private_repo in private_repos:
+                    yield [
                         "Organization",
-                        "Dependabot",
-                        dep_secret_name,
-                        dep_secret_visibility,
-                        dep_private_repo_name,
-                        dep_private_repo_id,
+                        secret_type,
+                        secret_name,
+                        secret_visibility,
+                        private_repo["name"],
+                        private_repo["databaseId"],
                     ]
-                )
-        else:
-            secret_rows.append(
-                [
+            else:
+                yield [
                     "Organization",
-                    "Dependabot",
-                    dep_secret_name,
-                    dep_secret_visibility,
+                    secret_type,
+                    secret_name,
+                    secret_visibility,
                     "all_repositories",
                     "NA",
                 ]
-            )
 
-    print("Gathering Codespaces secrets.")
-    org_codespace_secrets_list = org_codespaces_secrets(org)
-    org_codespace_secrets_list = org_codespace_secrets_list["secrets"]
-    for codespace_secret in org_codespace_secrets_list:
-        codespace_secret_name = codespace_secret["name"]
-        codespace_secret_visibility = codespace_secret["visibility"]
-        if codespace_secret_visibility == "selected":
-            codespace_scoped_repo_list = scoped_org_codespace_secrets(
-                org, codespace_secret_name
-            )
-            codespace_scoped_repo_list = codespace_scoped_repo_list["repositories"]
-            for codespace_scope_list in codespace_scoped_repo_list:
-                codespace_scoped_repo_name = codespace_scope_list["name"]
-                codespace_scoped_repo_id = codespace_scope_list["id"]
-                secret_rows.append(
-                    [
-                        "Organization",
-                        "Codespaces",
-                        codespace_secret_name,
-                        codespace_secret_visibility,
-                        codespace_scoped_repo_name,
-                        codespace_scoped_repo_id,
-                    ]
-                )
-        elif codespace_secret_visibility == "private":
-            codespace_private_repo_list = list_repo_visibility(org)
-            for codespace_private_repo in codespace_private_repo_list:
-                codespace_private_repo_name = codespace_private_repo["name"]
-                codespace_private_repo_id = codespace_private_repo["databaseId"]
-                codespace_private_repo_visibility = codespace_private_repo["visibility"]
-            if (
-                codespace_private_repo_visibility == "PUBLIC"
-                or codespace_private_repo_visibility == "INTERNAL"
-            ):
-                secret_rows.append(
-                    [
-                        "Organization",
-                        "Codespaces",
-                        codespace_secret_name,
-                        codespace_secret_visibility,
-                        codespace_private_repo_name,
-                        codespace_private_repo_id,
-                    ]
-                )
-        else:
-            secret_rows.append(
+
+def org_repo_secrets_report(org):
+    """
+    Generate a report for organization and repository levels list of secrets.
+    Input: organization name.
+    Output: CSV file with report.
+    """
+    print(f"Generating secrets report for the {org} organization...")
+    report_time = datetime.now()
+    report_time = time.isoformat("T", "seconds")
+    checkpoint_path = checkpoint_file or f"{org}-secrets-report-checkpoint.json"
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        checkpoint = {
+            "report": f"{report_time}-{org}-organization-secrets-report.csv",
+            "org_secrets_done": False,
+            "cursor": None,
+            "completed_repos": [],
+        }
+        report_mode = "w"
+    else:
+        print(f"Resuming the report in {checkpoint['report']}...")
+        report_mode = "a"
+        # Rows written after the checkpoint was saved are collected again
+        if "report_size" in checkpoint:
+            os.truncate(checkpoint["report"], checkpoint["report_size"])
+    repo_pages = list_repo_visibility(org, checkpoint["cursor"])
+
+    with open(checkpoint["report"], report_mode, newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        if report_mode == "w":
+            writer.writerow(
                 [
-                    "Organization",
-                    "Codespaces",
-                    codespace_secret_name,
-                    codespace_secret_visibility,
-                    "all_repositories",
-                    "NA",
+                    "SecretLevel",
+                    "SecretType",
+                    "SecretName",
+                    "SecretAccess",
+                    "RepositoryName",
+                    "RepositoryID",
                 ]
             )
-
-    print("Gathering repository specific secrets.")
-    for org_repo in org_repos:
-        repo_name = org_repo["name"]
-        repo_id = org_repo["databaseId"]
-        repo_action_secret_list = repo_action_secrets(org, repo_name)
-        if repo_action_secret_list is not None:
-            repo_action_secret_list = repo_action_secret_list["secrets"]
-            for repo_action_secret in repo_action_secret_list:
-                repo_action_secret_name = repo_action_secret["name"]
-                secret_rows.append(
-                    [
-                        "Repository",
-                        "Action",
-                        repo_action_secret_name,
-                        "repo",
-                        repo_name,
-                        repo_id,
+        if not checkpoint["org_secrets_done"]:
+            org_repos = [repo for page_repos, _ in repo_pages for repo in page_repos]
+            repo_index = index_repos_by_visibility(org_repos)
+            private_repos = repo_index["PRIVATE"] + repo_index["INTERNAL"]
+            writer.writerows(org_secrets(org, private_repos))
+            checkpoint["org_secrets_done"] = True
+            checkpoint_report(csvfile, checkpoint_path, checkpoint)
+
+        print("Gathering repository specific secrets.")
+        completed_repos = set(checkpoint["completed_repos"])
+        skipped_repo_count = 0
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for page_repos, end_cursor in repo_pages:
+                    page_repos = [
+                        repo
+                        for repo in page_repos
+                        if repo["name"] not in completed_repos
                     ]
-                )
-        repo_dependabot_secrets_list = repo_dependabot_secrets(org, repo_name)
-        if repo_dependabot_secrets_list is not None:
-            repo_dependabot_secrets_list = repo_dependabot_secrets_list["secrets"]
-            for repo_dep_secret in repo_dependabot_secrets_list:
-                repo_dep_secret_name = repo_dep_secret["name"]
-                secret_rows.append(
-                    [
-                        "Repository",
-                        "Dependabot",
-                        repo_dep_secret_name,
-                        "repo",
-                        repo_name,
-                        repo_id,
-                    ]
-                )
-        repo_codespace_secrets_list = repo_codespaces_secrets(org, repo_name)
-        if repo_codespace_secrets_list is not None:
-            repo_codespace_secrets_list = repo_codespace_secrets_list["secrets"]
-            for repo_codespace_secret in repo_codespace_secrets_list:
-                repo_codespace_secret_name = repo_codespace_secret["name"]
-                secret_rows.append(
-                    [
-                        "Repository",
-                        "Codespaces",
-                        repo_codespace_secret_name,
-                        "repo",
-                        repo_name,
-                        repo_id,
+                    candidate_repos = [
+                        repo for repo in page_repos if not skip_repo(repo)
                     ]
+                    skipped_repo_count += len(page_repos) - len(candidate_repos)
+                    page_repos = candidate_repos
+                    repo_rows_list = bounded_map(
+                        executor,
+                        partial(repo_secrets, org),
+                        page_repos,
+                        concurrency * 2,
+                    )
+                    for org_repo, repo_rows in zip(page_repos, repo_rows_list):
+                        writer.writerows(repo_rows)
+                        checkpoint["completed_repos"].append(org_repo["name"])
+                        if len(checkpoint["completed_repos"]) % FLUSH_INTERVAL == 0:
+                            checkpoint_report(csvfile, checkpoint_path, checkpoint)
+                    checkpoint["cursor"] = end_cursor
+                    checkpoint["completed_repos"] = []
+                    completed_repos = set()
+            if skip_repos:
+                # Each skipped repository saves the Action, Dependabot and Codespaces calls
+                print(
+                    f"Skipped {skipped_repo_count} repositories, "
+                    f"saving {skipped_repo_count * 3} REST calls."
                 )
-
-    with open(
-        f"{report_time}-{org}-organization-secrets-report.csv", "w", newline=""
-    ) as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(
-            [
-                "SecretLevel",
-                "SecretType",
-                "SecretName",
-                "SecretAccess",
-                "RepositoryName",
-                "RepositoryID",
-            ]
-        )
-        writer.writerows(secret_rows)
+        except RestClientError as e:
+            print(e)
+            print("Stopped before the report was complete, rerun to resume it.")
+            sys.exit(1)
+        finally:
+            checkpoint_report(csvfile, checkpoint_path, checkpoint)
+
+    os.remove(checkpoint_path)
 
 
 org_repo_secrets_report(organization)
@@ -0,0 +1,69 @@
+"""
+Helpers shared by the scripts that read GitHub migration archives.
+
+The archives are read as tar streams, and their JSON files one item at a time,
+so an archive of any size is decompressed once and never held in memory.
+"""
+
+import codecs
+import json
+import os
+import re
+
+# Bytes read from a JSON file of an archive at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(json_file):
+    """
+    Yield the items of the JSON array in a binary file one at a time, reading
+    it in chunks, so only the item being parsed is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    # decode chunks that may end in the middle of a multi-byte character
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunk = json_file.read(CHUNK_SIZE)
+    buffer = utf8.decode(chunk, final=not chunk).lstrip()
+    # white space at the start may fill whole chunks
+    while chunk and not buffer:
+        chunk = json_file.read(CHUNK_SIZE)
+        buffer = utf8.decode(chunk, final=not chunk).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    position = 1
+    end_of_file = False
+    while True:
+        # skip the white space and comma before the next item
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            item, item_end = decoder.raw_decode(buffer, position)
+            # an item reaching the end of the buffer may continue in the next chunk
+            complete = item_end < len(buffer) or end_of_file
+        except json.JSONDecodeError:
+            if end_of_file:
+                raise
+            complete = False
+        if complete:
+            yield item
+            position = item_end
+            continue
+        chunk = json_file.read(CHUNK_SIZE)
+        end_of_file = not chunk
+        buffer = buffer[position:] + utf8.decode(chunk, final=end_of_file)
+        position = 0
+
+
+# Data files of an archive, such as repositories_000001.json
+JSON_MEMBER = re.compile(r"^([a-z_]+?)_\d+\.json$")
+
+
+def json_member_prefix(member_name):
+    """
+    Get the prefix of a data file of an archive, such as pull_requests for
+    pull_requests_000001.json, or None for any other member.
+    """
+    match = JSON_MEMBER.match(os.path.basename(member_name))
+    return match.group(1) if match else None
@@ -0,0 +1,176 @@
+"""
+This script indexes GitHub migration archives into a local SQLite catalog of
+their members and of the items of their data files, such as users,
+repositories, teams, issues and pull requests, so later lookups and reports
+read the catalog instead of decompressing the archives again.
+
+Environment Variables:
+    ARCHIVE_PATH (str): Path of the archive, or of several archives separated by commas
+    CATALOG_PATH (str): Path of the SQLite catalog (default archive-catalog.db)
+"""
+
+import os
+import sqlite3
+import tarfile
+import time
+
+from archive_utils import iter_json_array, json_member_prefix
+
+# Get environment variables
+# ARCHIVE_PATH can list several archives separated by commas
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH")
+CATALOG_PATH = os.getenv("CATALOG_PATH", "archive-catalog.db")
+
+# Rows inserted into the catalog at a time
+BATCH_SIZE = 1000
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime REAL,
+    indexed_at REAL);
+CREATE TABLE IF NOT EXISTS members (
+    archive_id INTEGER, name TEXT, size INTEGER, offset INTEGER,
+    offset_data INTEGER, entity_type TEXT);
+CREATE TABLE IF NOT EXISTS entities (
+    archive_id INTEGER, member_name TEXT, position INTEGER, entity_type TEXT,
+    url TEXT, key TEXT, title TEXT, repository TEXT, created_at TEXT);
+CREATE INDEX IF NOT EXISTS members_name ON members (name);
+CREATE INDEX IF NOT EXISTS entities_type ON entities (entity_type);
+CREATE INDEX IF NOT EXISTS entities_url ON entities (url);
+CREATE INDEX IF NOT EXISTS entities_key ON entities (key);
+"""
+
+
+def open_catalog(catalog_path):
+    """
+    Open or create the SQLite catalog of archive contents.
+    """
+    catalog = sqlite3.connect(catalog_path)
+    catalog.executescript(CATALOG_SCHEMA)
+    return catalog
+
+
+def entity_fields(item, prefix):
+    """
+    Get the type and key fields of an item of an archive data file: its url,
+    its login, name or number, its title and the url of its repository.
+    """
+    key = item.get("login") or item.get("name") or item.get("number")
+    repository = item.get("repository")
+    return (
+        item.get("type") or prefix,
+        item.get("url"),
+        None if key is None else str(key),
+        item.get("title"),
+        repository if isinstance(repository, str) else None,
+        item.get("created_at"),
+    )
+
+
+def find_archive(catalog, archive_path):
+    """
+    Get the catalog id of an archive, or None if it changed since it was
+    indexed or was never indexed.
+    """
+    stat = os.stat(archive_path)
+    row = catalog.execute(
+        "SELECT id FROM archives WHERE path = ? AND size = ? AND mtime = ?",
+        (os.path.abspath(archive_path), stat.st_size, stat.st_mtime),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def index_archive(catalog, archive_path):
+    """
+    Record the members of an archive and the items of its data files in the
+    catalog, reading the archive in a single streaming pass.
+    """
+    path = os.path.abspath(archive_path)
+    stat = os.stat(archive_path)
+    # replace what an earlier run recorded for this archive
+    row = catalog.execute("SELECT id FROM archives WHERE path = ?", (path,)).fetchone()
+    if row:
+        catalog.execute("DELETE FROM members WHERE archive_id = ?", row)
+        catalog.execute("DELETE FROM entities WHERE archive_id = ?", row)
+        catalog.execute("DELETE FROM archives WHERE id = ?", row)
+    archive_id = catalog.execute(
+        "INSERT INTO archives (path, size, mtime, indexed_at) VALUES (?, ?, ?, ?)",
+        (path, stat.st_size, stat.st_mtime, time.time()),
+    ).lastrowid
+
+    members = []
+    entities = []
+    # open the archive as a stream, so it is decompressed once from start to end
+    with tarfile.open(archive_path, "r|gz") as tarfiles:
+        for member in tarfiles:
+            prefix = json_member_prefix(member.name) if member.isfile() else None
+            members.append(
+                (
+                    archive_id,
+                    member.name,
+                    member.size,
+                    member.offset,
+                    member.offset_data,
+                    prefix,
+                )
+            )
+            if prefix is None:
+                continue
+            # parse items one at a time instead of loading the whole file
+            json_file = tarfiles.extractfile(member)
+            for position, item in enumerate(iter_json_array(json_file)):
+                entities.append(
+                    (archive_id, member.name, position, *entity_fields(item, prefix))
+                )
+                if len(entities) >= BATCH_SIZE:
+                    catalog.executemany(
+                        "INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        entities,
+                    )
+                    entities = []
+            if len(members) >= BATCH_SIZE:
+                catalog.executemany(
+                    "INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)", members
+                )
+                members = []
+    catalog.executemany("INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)", members)
+    catalog.executemany(
+        "INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", entities
+    )
+    # the archive is only recorded once all of it is indexed
+    catalog.commit()
+    return archive_id
+
+
+def entity_counts(catalog, archive_id):
+    """
+    Count the items of an archive by type, from the catalog.
+    """
+    return catalog.execute(
+        "SELECT entity_type, COUNT(*) FROM entities WHERE archive_id = ? "
+        "GROUP BY entity_type ORDER BY entity_type",
+        (archive_id,),
+    ).fetchall()
+
+
+def main():
+    """
+    Index the archives in ARCHIVE_PATH that are not in the catalog yet and
+    print the number of items of each type they hold.
+    """
+    archive_paths = [path.strip() for path in ARCHIVE_PATH.split(",") if path.strip()]
+    catalog = open_catalog(CATALOG_PATH)
+    for archive_path in archive_paths:
+        archive_id = find_archive(catalog, archive_path)
+        if archive_id is None:
+            print(f"Indexing {archive_path}")
+            archive_id = index_archive(catalog, archive_path)
+        else:
+            print(f"{archive_path} is already in {CATALOG_PATH}")
+        for entity_type, count in entity_counts(catalog, archive_id):
+            print(f"  {entity_type}: {count}")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
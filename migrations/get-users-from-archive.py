@@ -1,29 +1,102 @@
+"""
+This script writes the users of GitHub migration archives to user-mapping.csv,
+with the login, name, primary email and url of each user.
+
+Environment Variables:
+    ARCHIVE_PATH (str): Path of the archive, or of several archives separated by commas
+    WORKERS (int): Number of archives to read in parallel (default the number of CPUs)
+"""
+
 import csv
 import os
 import tarfile
-import json
+from concurrent.futures import ProcessPoolExecutor
+
+from archive_utils import iter_json_array
 
 # Get environment variables
-ARCHIVE_PATH = os.getenv('ARCHIVE_PATH')
-
-tarfiles = tarfile.open(ARCHIVE_PATH, "r:gz")
-MAPPING_HEADER = ["login","name","email","url"]
-
-with open("user-mapping.csv", "w") as new_file:
-    # create user-mapping csv to write to
-    csv_writer = csv.writer(new_file)
-    csv_writer.writerow(MAPPING_HEADER)
-
-    # iterate through tarfile to find users_*.json files
-    for filename in tarfiles.getnames():
-        if "users_" in filename:
-            contents = json.loads(tarfiles.extractfile(filename).read())
-            for row in contents:
-                login = row["login"]
-                name = row["name"]
-                email = ""
-                for emails in row["emails"]:
-                    if emails["primary"]:
-                        email = emails["address"]
-                url = row["url"]
-                csv_writer.writerow([login, name, email, url])
+# ARCHIVE_PATH can list several archives separated by commas
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH")
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+
+
+def iter_users(archive_path):
+    """
+    Yield the login, name, primary email and url of every user in an archive,
+    reading it in a single streaming pass.
+    """
+    # open the archive as a stream, so it is decompressed once from start to end
+    with tarfile.open(archive_path, "r|gz") as tarfiles:
+        # iterate through tarfile members as they go by to find users_*.json files
+        for member in tarfiles:
+            if member.isfile() and "users_" in member.name:
+                # parse users one at a time instead of loading the whole file
+                for row in iter_json_array(tarfiles.extractfile(member)):
+                    login = row["login"]
+                    name = row["name"]
+                    email = ""
+                    for emails in row["emails"]:
+                        if emails["primary"]:
+                            email = emails["address"]
+                    url = row["url"]
+                    yield [login, name, email, url]
+
+
+def merge_user(user_index, user):
+    """
+    Add a user to the login-keyed index. A login seen before keeps its first
+    values, with any empty name, email or url filled in from this user.
+    """
+    known_user = user_index.setdefault(user[0], user)
+    for field in range(1, len(user)):
+        if not known_user[field] and user[field]:
+            known_user[field] = user[field]
+
+
+def read_users(archive_path):
+    """
+    Get the users of an archive with one row per login, merged as they are
+    read, so a worker process only sends the unique users back.
+    """
+    user_index = {}
+    for user in iter_users(archive_path):
+        merge_user(user_index, user)
+    return list(user_index.values())
+
+
+def merge_archives(archive_paths):
+    """
+    Read one archive per process and merge their users, in the order of the
+    archives, into one index with a single row per login.
+    """
+    user_index = {}
+    with ProcessPoolExecutor(max(1, min(WORKERS, len(archive_paths)))) as executor:
+        for users in executor.map(read_users, archive_paths):
+            for user in users:
+                merge_user(user_index, user)
+    return user_index
+
+
+MAPPING_HEADER = ["login", "name", "email", "url"]
+
+
+def main():
+    """
+    Write the users of the archives in ARCHIVE_PATH to user-mapping.csv.
+    """
+    archive_paths = [path.strip() for path in ARCHIVE_PATH.split(",") if path.strip()]
+
+    with open("user-mapping.csv", "w", encoding="utf-8") as new_file:
+        # create user-mapping csv to write to
+        csv_writer = csv.writer(new_file)
+        csv_writer.writerow(MAPPING_HEADER)
+
+        if len(archive_paths) == 1:
+            # the users of a single archive are written as they are read
+            csv_writer.writerows(iter_users(archive_paths[0]))
+        else:
+            csv_writer.writerows(merge_archives(archive_paths).values())
+
+
+if __name__ == "__main__":
+    main()